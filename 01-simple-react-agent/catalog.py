@@ -0,0 +1,212 @@
+import bisect
+import difflib
+import sqlite3
+import threading
+import unicodedata
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+
+def normalize_city(name):
+    """Case-, accent- and whitespace-insensitive key for a city name."""
+    decomposed = unicodedata.normalize('NFKD', name)
+    ascii_only = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(ascii_only.casefold().replace('-', ' ').split())
+
+
+class Catalog(ABC):
+    """
+    Shared lookup logic for travel catalogs.
+    Backends only need to resolve a normalized key to a record, list the
+    keys that start with a prefix and list the keys next to a key (all in
+    sorted-index time), so a lookup costs the same for a dozen cities or a
+    few hundred thousand.
+    """
+
+    fuzzy_candidates = 200
+
+    @abstractmethod
+    def record(self, key):
+        """Return {'name', 'weather', 'attractions', 'hotels'} for a normalized key, or None."""
+
+    @abstractmethod
+    def keys_with_prefix(self, prefix, limit):
+        """Up to `limit` keys starting with the normalized `prefix`, in sorted order."""
+
+    @abstractmethod
+    def keys_around(self, key, limit):
+        """Up to `limit` keys sorting before `key` and up to `limit` from `key` on, in sorted order."""
+
+    def resolve(self, city):
+        """Map a user-supplied city name to a catalog key: exact, then unique prefix, then fuzzy."""
+        key = normalize_city(city)
+        if not key:
+            return None
+        if self.record(key) is not None:
+            return key
+
+        matches = self.keys_with_prefix(key, 2)
+        if len(matches) == 1:
+            return matches[0]
+
+        # The whole bucket sharing the first two letters when it's small, plus the keys next to
+        # where the typed key sorts, so a typo late in a big bucket still meets its neighbours
+        candidates = set(self.keys_with_prefix(key[:2], self.fuzzy_candidates))
+        candidates.update(self.keys_around(key, self.fuzzy_candidates // 2))
+        close = difflib.get_close_matches(key, sorted(candidates), n=1, cutoff=0.8)
+        return close[0] if close else None
+
+    def lookup(self, city):
+        key = self.resolve(city)
+        return self.record(key) if key else None
+
+    def lookup_many(self, cities):
+        """Batch lookup: {city: record or None} for every requested city."""
+        return {city: self.lookup(city) for city in cities}
+
+    def suggest(self, prefix, limit=10):
+        """Display names of the cities starting with `prefix`."""
+        return [self.record(key)['name'] for key in self.keys_with_prefix(normalize_city(prefix), limit)]
+
+
+class DictCatalog(Catalog):
+    """Catalog over in-memory dicts, for the small demo data."""
+
+    def __init__(self, weather, hotels, attractions):
+        names = set(weather) | set(hotels) | set(attractions)
+        self.records = {
+            normalize_city(name): {
+                'name': name,
+                'weather': weather.get(name),
+                'attractions': attractions.get(name),
+                'hotels': hotels.get(name, {}),
+            }
+            for name in names
+        }
+        self.keys = sorted(self.records)
+
+    def record(self, key):
+        return self.records.get(key)
+
+    def keys_with_prefix(self, prefix, limit):
+        start = bisect.bisect_left(self.keys, prefix)
+        matches = []
+        for key in self.keys[start:start + limit]:
+            if not key.startswith(prefix):
+                break
+            matches.append(key)
+        return matches
+
+    def keys_around(self, key, limit):
+        position = bisect.bisect_left(self.keys, key)
+        return self.keys[max(0, position - limit):position + limit]
+
+
+class SQLiteCatalog(Catalog):
+    """
+    Catalog backed by a prebuilt SQLite file (see build_catalog).
+    The file is opened read-only and memory-mapped; nothing is parsed up front,
+    and every lookup is a B-tree probe on the normalized city key.
+    """
+
+    def __init__(self, path, mmap_bytes=256 * 1024 * 1024):
+        self.path = Path(path)
+        self.mmap_bytes = mmap_bytes
+        self._local = threading.local()
+
+    @property
+    def db(self):
+        # One connection per thread, so tools can run concurrently
+        if not hasattr(self._local, 'db'):
+            db = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True)
+            db.execute(f'PRAGMA mmap_size = {int(self.mmap_bytes)}')
+            self._local.db = db
+        return self._local.db
+
+    def record(self, key):
+        row = self.db.execute(
+            'SELECT name, weather, attractions FROM cities WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        return self._record(key, row, self._hotels([key]).get(key, {}))
+
+    def keys_with_prefix(self, prefix, limit):
+        rows = self.db.execute(
+            'SELECT key FROM cities WHERE key >= ? AND key < ? ORDER BY key LIMIT ?',
+            (prefix, prefix + '\uffff', limit),
+        )
+        return [key for (key,) in rows]
+
+    def keys_around(self, key, limit):
+        before = self.db.execute(
+            'SELECT key FROM cities WHERE key < ? ORDER BY key DESC LIMIT ?', (key, limit)
+        ).fetchall()
+        after = self.db.execute(
+            'SELECT key FROM cities WHERE key >= ? ORDER BY key LIMIT ?', (key, limit)
+        ).fetchall()
+        return [k for (k,) in reversed(before)] + [k for (k,) in after]
+
+    def lookup_many(self, cities):
+        keys = {city: self.resolve(city) for city in cities}
+        wanted = sorted({key for key in keys.values() if key})
+        if not wanted:
+            return {city: None for city in cities}
+
+        placeholders = ','.join('?' * len(wanted))
+        rows = self.db.execute(
+            f'SELECT key, name, weather, attractions FROM cities WHERE key IN ({placeholders})', wanted
+        )
+        hotels = self._hotels(wanted)
+        records = {row[0]: self._record(row[0], row[1:], hotels.get(row[0], {})) for row in rows}
+        return {city: records.get(key) for city, key in keys.items()}
+
+    def _hotels(self, keys):
+        placeholders = ','.join('?' * len(keys))
+        hotels = {}
+        rows = self.db.execute(
+            f'SELECT city_key, tier, name FROM hotels WHERE city_key IN ({placeholders}) ORDER BY rowid', keys
+        )
+        for key, tier, name in rows:
+            hotels.setdefault(key, {}).setdefault(tier, []).append(name)
+        return hotels
+
+    @staticmethod
+    def _record(key, row, hotels):
+        name, weather, attractions = row
+        return {'name': name, 'weather': weather, 'attractions': attractions, 'hotels': hotels}
+
+
+def build_catalog(path, weather, hotels, attractions):
+    """
+    Write a compact catalog file from weather/hotel/attraction mappings.
+    Run this offline once; the tools then open the result with SQLiteCatalog.
+    """
+    path = Path(path)
+    path.unlink(missing_ok=True)
+    db = sqlite3.connect(path)
+    db.executescript('''
+        CREATE TABLE cities (
+            key TEXT PRIMARY KEY, name TEXT NOT NULL, weather TEXT, attractions TEXT
+        ) WITHOUT ROWID;
+        CREATE TABLE hotels (city_key TEXT NOT NULL, tier TEXT NOT NULL, name TEXT NOT NULL);
+        CREATE INDEX hotels_city ON hotels (city_key, tier);
+    ''')
+    names = set(weather) | set(hotels) | set(attractions)
+    db.executemany(
+        'INSERT OR REPLACE INTO cities VALUES (?, ?, ?, ?)',
+        ((normalize_city(n), n, weather.get(n), attractions.get(n)) for n in names),
+    )
+    db.executemany(
+        'INSERT INTO hotels VALUES (?, ?, ?)',
+        (
+            (normalize_city(city), tier, name)
+            for city, tiers in hotels.items()
+            for tier, tier_hotels in tiers.items()
+            for name in tier_hotels
+        ),
+    )
+    db.commit()
+    db.execute('VACUUM')
+    db.close()
+    return path
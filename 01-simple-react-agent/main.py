@@ -1,45 +1,209 @@
-from openai import OpenAI
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+# catalog.py sits next to this file; don't count on being run as a script from this directory
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
 from dotenv import load_dotenv
+import asyncio
 import json
 from datetime import datetime, timedelta
+import inspect
+import os
 import re
+from concurrent.futures import ThreadPoolExecutor
+from catalog import DictCatalog, SQLiteCatalog
+from common.clients import Lazy, async_openai_client, openai_client
+from common.history import TokenBudgetHistory
+from common.llm_cache import ResponseCache
+from common.metrics import METRICS, InstrumentedOpenAI, export_from_env
 
 load_dotenv()
-client = OpenAI()
+# Built on first use over the shared connection pool; every completion is recorded in METRICS
+client = Lazy(lambda: InstrumentedOpenAI(openai_client(), name='agent'))
+async_client = Lazy(lambda: InstrumentedOpenAI(async_openai_client(), name='agent'))
+response_cache = ResponseCache()
+METRICS.track_cache('llm', response_cache.cache)
+
+# The text protocol ends each action block with STOP. In the 'stop' mode the API stops
+# generating at either sequence, so the model can't go on to invent its own observations.
+# That also cuts a final answer at any literal "STOP", so the default 'text' mode doesn't use them
+STOP_SEQUENCES = ['STOP', '\nObservation:']
+
+# Questions answer_all works on at once; the rest wait, so a long list doesn't open
+# as many simultaneous requests (and tool threads) as it has questions
+ANSWER_CONCURRENCY = 8
 
 class Agent:
-    def __init__(self, system=''):
+    def __init__(self, system='', token_budget=4000, stream=False, stop=None):
         """
         Initialize the agent with an optional system message.
         The system message is like giving the agent its personality or instructions.
+        The history sent to the model is kept within `token_budget` tokens
+        (None disables the limit) so long tool loops don't grow every request.
+        With `stream=True` the completion is streamed and cut off as soon as
+        the action block is complete (see complete_reply); `stop` is a list of
+        stop sequences for the API.
         """
         self.system = system
-        self.messages = []
+        self.stream = stream
+        self.stop = stop
+        self.history = TokenBudgetHistory(system, budget=token_budget)
 
-        if self.system:
-            self.messages.append({'role': 'system', 'content': system})
+    @property
+    def messages(self):
+        return self.history.messages
 
     def __call__(self, prompt):
         """
         Allow the agent to be called like a function: agent("your question")
         This makes it feel natural to use.
         """
-        self.messages.append({'role': 'user', 'content': prompt})
+        self.history.append({'role': 'user', 'content': prompt})
         result = self.execute()
-        self.messages.append({'role': 'assistant', 'content': result})
+        self.history.append({'role': 'assistant', 'content': result})
         return result
 
+    def actions(self, response):
+        """The (tool_name, tool_input) pairs the response asks for."""
+        return parse_actions(response)
+
+    def observation(self, actions, results):
+        """The next input to the agent, carrying the tool results."""
+        return format_observations(actions, results)
+
+    @property
+    def mode(self):
+        """The make_agent mode: 'text', 'stop' or 'stream'."""
+        return 'stream' if self.stream else 'stop' if self.stop else 'text'
+
+    def params(self, temperature):
+        """Request parameters that shape the reply."""
+        params = {'temperature': temperature}
+        if self.stop:
+            params['stop'] = self.stop
+        return params
+
+    def cache_params(self, params):
+        # Stop sequences and the streamed cut-off each shorten replies differently, so modes don't share entries
+        return {**params, 'mode': self.mode}
+
     def execute(self, model='gpt-4o-mini', temperature=0):
         """f
         Send all messages to the language model and get a response.
-        Temperature=0 means the model will be deterministic (same answer every time).
+        Temperature=0 means the model will be deterministic (same answer every time),
+        so those responses are cached and identical conversations skip the API.
         """
-        completion = client.chat.completions.create(
-            model=model,
-            temperature=temperature,
-            messages=self.messages
-        )
-        return completion.choices[0].message.content
+        params = self.params(temperature)
+        key = self.cache_params(params)
+        cached = response_cache.lookup(model, key, self.messages)
+        if cached is not None:
+            return cached
+
+        if self.stream:
+            content = read_reply(client.chat.completions.create(
+                model=model, messages=self.messages, stream=True, stream_options={'include_usage': True}, **params
+            ))
+        else:
+            completion = client.chat.completions.create(model=model, messages=self.messages, **params)
+            content = completion.choices[0].message.content
+        response_cache.store(model, key, self.messages, content)
+        return content
+
+class AsyncAgent(Agent):
+    """
+    Same as Agent, but awaits the model so many conversations can run at once.
+    The SQLite response cache is read and written in a worker thread, so a
+    slow lookup doesn't hold up the other conversations on the event loop.
+    """
+
+    async def __call__(self, prompt):
+        self.history.append({'role': 'user', 'content': prompt})
+        result = await self.execute()
+        self.history.append({'role': 'assistant', 'content': result})
+        return result
+
+    async def execute(self, model='gpt-4o-mini', temperature=0):
+        params = self.params(temperature)
+        key = self.cache_params(params)
+        cached = await asyncio.to_thread(response_cache.lookup, model, key, self.messages)
+        if cached is not None:
+            return cached
+
+        if self.stream:
+            content = await aread_reply(await async_client.chat.completions.create(
+                model=model, messages=self.messages, stream=True, stream_options={'include_usage': True}, **params
+            ))
+        else:
+            completion = await async_client.chat.completions.create(model=model, messages=self.messages, **params)
+            content = completion.choices[0].message.content
+        await asyncio.to_thread(response_cache.store, model, key, self.messages, content)
+        return content
+
+class ToolCallingAgent(Agent):
+    """
+    Agent that uses the API's native tool calling instead of the text protocol.
+    Tools are described to the model as JSON schemas built from `tools`, and it
+    answers with structured tool calls, so there is no action text to write
+    and nothing after the calls to cut off.
+    """
+
+    def __init__(self, system='', tools=None, token_budget=4000):
+        super().__init__(system, token_budget)
+        self.tools = tool_schemas(tools if tools is not None else available_tools)
+        self.tool_calls = []
+
+    def __call__(self, prompt):
+        self.add_input(prompt)
+        return self.add_reply(self.execute())
+
+    def add_input(self, prompt):
+        """A question (str) or the tool messages answering the last tool calls."""
+        for message in [{'role': 'user', 'content': prompt}] if isinstance(prompt, str) else prompt:
+            self.history.append(message)
+
+    def add_reply(self, reply):
+        self.history.append(reply)
+        self.tool_calls = reply.get('tool_calls') or []
+        return reply['content'] or ''
+
+    def actions(self, response):
+        return [(call['function']['name'], tool_argument(call)) for call in self.tool_calls]
+
+    def observation(self, actions, results):
+        return [
+            {'role': 'tool', 'tool_call_id': call['id'], 'content': str(result)}
+            for call, result in zip(self.tool_calls, results)
+        ]
+
+    def execute(self, model='gpt-4o-mini', temperature=0):
+        params = {'temperature': temperature, 'tools': self.tools}
+        cached = response_cache.lookup(model, params, self.messages)
+        if cached is not None:
+            return cached
+
+        completion = client.chat.completions.create(model=model, messages=self.messages, **params)
+        reply = reply_message(completion.choices[0].message)
+        response_cache.store(model, params, self.messages, reply)
+        return reply
+
+class AsyncToolCallingAgent(ToolCallingAgent):
+    """Same as ToolCallingAgent, but awaits the model (and the cache, as AsyncAgent does)."""
+
+    async def __call__(self, prompt):
+        self.add_input(prompt)
+        return self.add_reply(await self.execute())
+
+    async def execute(self, model='gpt-4o-mini', temperature=0):
+        params = {'temperature': temperature, 'tools': self.tools}
+        cached = await asyncio.to_thread(response_cache.lookup, model, params, self.messages)
+        if cached is not None:
+            return cached
+
+        completion = await async_client.chat.completions.create(model=model, messages=self.messages, **params)
+        reply = reply_message(completion.choices[0].message)
+        await asyncio.to_thread(response_cache.store, model, params, self.messages, reply)
+        return reply
 
 system_prompt = '''
 You are a helpful travel assistant. When users ask questions, respond in this exact format:
@@ -54,14 +218,23 @@ Available tools:
 - search_hotels: <city, budget> - Find hotels matching criteria
 - get_attractions: <city> - List top attractions in the area
 
-Use these tools to help users plan trips. Call one tool per response, then STOP.
+Use these tools to help users plan trips. If you need several tools, list every
+Action in the same response, one per line, then STOP.
 
-Example: If asked "What should I pack for Tokyo?"
-Thought: I need to know the current weather in Tokyo to give good packing advice.
+Example: If asked "What should I pack for Tokyo and where should I stay?"
+Thought: I need the weather in Tokyo for packing advice and mid-range hotel options.
 Action: check_weather: Tokyo
+Action: search_hotels: Tokyo, mid
 STOP
 
-You will receive the weather data back, then continue with your answer.
+You will receive all the results back together, then continue with your answer.
+'''
+
+# For ToolCallingAgent: the tool list and call format come from the API instead
+tool_system_prompt = '''
+You are a helpful travel assistant. Use the tools to look up weather, hotels and
+attractions for the user's trip. If you need several tools, call them all at once.
+When you have their results, give your final answer.
 '''
 
 # Mock weather data for demonstration
@@ -86,11 +259,26 @@ HOTELS = {
     }
 }
 
+# Mock attractions database
+ATTRACTIONS = {
+    'Tokyo': 'Senso-ji Temple, Shibuya Crossing, Meiji Shrine, teamLab Borderless',
+    'Paris': 'Eiffel Tower, Louvre Museum, Notre-Dame, Champs-Élysées',
+    'New York': 'Statue of Liberty, Central Park, Times Square, Empire State Building'
+}
+
+# Point TRAVEL_CATALOG at a file made with catalog.build_catalog to serve a full-size catalog
+catalog = (
+    SQLiteCatalog(os.environ['TRAVEL_CATALOG']) if os.getenv('TRAVEL_CATALOG')
+    else DictCatalog(WEATHER_DATA, HOTELS, ATTRACTIONS)
+)
+
 # Tool functions
 def check_weather(city):
     """Look up weather information for a destination."""
-    weather = WEATHER_DATA.get(city, 'City not found')
-    return f"{city}: {weather}"
+    record = catalog.lookup(city)
+    if not record or not record['weather']:
+        return f"{city}: City not found"
+    return f"{record['name']}: {record['weather']}"
 
 def search_hotels(city_and_budget):
     """Search for hotels by city and budget level."""
@@ -98,20 +286,19 @@ def search_hotels(city_and_budget):
     city = parts[0].strip()
     budget = parts[1].strip() if len(parts) > 1 else 'mid'
 
-    if city not in HOTELS:
+    record = catalog.lookup(city)
+    if not record or not record['hotels']:
         return f"No hotels found for {city}"
 
-    hotels = HOTELS[city].get(budget, [])
-    return f"{budget.title()} hotels in {city}: {', '.join(hotels)}"
+    hotels = record['hotels'].get(budget.lower(), [])
+    return f"{budget.title()} hotels in {record['name']}: {', '.join(hotels)}"
 
 def get_attractions(city):
     """Get popular attractions in a city."""
-    attractions = {
-        'Tokyo': 'Senso-ji Temple, Shibuya Crossing, Meiji Shrine, teamLab Borderless',
-        'Paris': 'Eiffel Tower, Louvre Museum, Notre-Dame, Champs-Élysées',
-        'New York': 'Statue of Liberty, Central Park, Times Square, Empire State Building'
-    }
-    return attractions.get(city, f"No attractions data for {city}")
+    record = catalog.lookup(city)
+    if not record or not record['attractions']:
+        return f"No attractions data for {city}"
+    return record['attractions']
 
 # Registry of available tools
 available_tools = {
@@ -120,6 +307,56 @@ available_tools = {
     'get_attractions': get_attractions
 }
 
+# Argument descriptions for the tool schemas; other parameters are described by name
+TOOL_ARGUMENTS = {
+    'city': 'City name, e.g. Tokyo',
+    'city_and_budget': "City and budget level (budget, mid or luxury), e.g. 'Tokyo, mid'",
+}
+
+def tool_schema(name, fn):
+    """OpenAI function-tool definition for a tool, from its signature and docstring."""
+    parameters = list(inspect.signature(fn).parameters)
+    return {
+        'type': 'function',
+        'function': {
+            'name': name,
+            'description': inspect.getdoc(fn) or name,
+            'parameters': {
+                'type': 'object',
+                'properties': {
+                    p: {'type': 'string', 'description': TOOL_ARGUMENTS.get(p, p.replace('_', ' '))}
+                    for p in parameters
+                },
+                'required': parameters,
+                'additionalProperties': False,
+            },
+        },
+    }
+
+def tool_schemas(tools):
+    return [tool_schema(name, fn) for name, fn in tools.items()]
+
+def tool_argument(call):
+    """The single string input our tools take, from a tool call's JSON arguments."""
+    try:
+        arguments = json.loads(call['function']['arguments'] or '{}')
+    except json.JSONDecodeError:
+        return call['function']['arguments']
+    if not isinstance(arguments, dict):
+        return str(arguments)
+    return ', '.join(str(value) for value in arguments.values())
+
+def reply_message(message):
+    """Assistant message from the API as a plain dict, ready for the history and the cache."""
+    reply = {'role': 'assistant', 'content': message.content}
+    if message.tool_calls:
+        reply['tool_calls'] = [
+            {'id': call.id, 'type': 'function',
+             'function': {'name': call.function.name, 'arguments': call.function.arguments}}
+            for call in message.tool_calls
+        ]
+    return reply
+
 ########### Example 1: Single Tool Call
 # travel_agent = Agent(system_prompt)
 
@@ -162,6 +399,95 @@ available_tools = {
 
 
 ########### The Automation Function
+# Regex to extract: Action: tool_name: input
+action_pattern = re.compile(r'^Action: (\w+): (.*)$', re.MULTILINE)
+
+def parse_actions(response):
+    """
+    Return every (tool_name, tool_input) pair in the response's action block.
+    Anything after the block (STOP, or a made-up Observation: the model went
+    on to write) is ignored, so actions it invented there never run.
+    """
+    # With a final newline every line is complete, so complete_reply only returns None
+    # when nothing follows the block
+    block = complete_reply(response + '\n')
+    if block is None:
+        block = response
+    return [(name, tool_input.strip()) for name, tool_input in action_pattern.findall(block)]
+
+def complete_reply(text):
+    """
+    Return `text` cut at the end of its action block, or None while the block
+    may still be growing. The block ends at a STOP after an Action: line, or at
+    the first complete line after an Action: line that isn't another action
+    (usually a made-up Observation:). Every action in the block is kept, so
+    several tools can still run in one step. A reply without actions (the
+    final answer) is read to the end, "STOP" and all.
+    """
+    first = action_pattern.search(text)
+    stop = text.find('STOP', first.end()) if first else -1
+    if stop != -1:
+        return text[:stop].rstrip()
+
+    seen_action = False
+    offset = 0
+    for line in text.splitlines(keepends=True):
+        if not line.endswith('\n'):
+            break
+        if action_pattern.match(line.rstrip('\n')):
+            seen_action = True
+        elif seen_action and line.strip():
+            return text[:offset].rstrip()
+        offset += len(line)
+    return None
+
+def read_reply(chunks):
+    """Read a streamed completion until its action block is complete, then close the stream."""
+    text = ''
+    try:
+        for chunk in chunks:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                text += delta
+                if (reply := complete_reply(text)) is not None:
+                    return reply
+        return text.rstrip()
+    finally:
+        chunks.close()
+
+async def aread_reply(chunks):
+    """Async counterpart of read_reply."""
+    text = ''
+    try:
+        async for chunk in chunks:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                text += delta
+                if (reply := complete_reply(text)) is not None:
+                    return reply
+        return text.rstrip()
+    finally:
+        await chunks.aclose()
+
+def format_observations(actions, results):
+    """Combine the results of several tool calls into one observation turn."""
+    if len(results) == 1:
+        return f"Observation: {results[0]}"
+    lines = [f"- {name}({tool_input}): {result}" for (name, tool_input), result in zip(actions, results)]
+    return "Observation:\n" + "\n".join(lines)
+
+def run_tools(actions, available_tools):
+    """Run the requested tools concurrently, returning results in request order."""
+    with ThreadPoolExecutor(max_workers=len(actions)) as pool:
+        futures = [pool.submit(available_tools[name], tool_input) for name, tool_input in actions]
+        return [f.result() for f in futures]
+
+async def arun_tools(actions, available_tools):
+    """Async counterpart of run_tools: each tool runs in a worker thread."""
+    return await asyncio.gather(*(
+        asyncio.to_thread(available_tools[name], tool_input) for name, tool_input in actions
+    ))
+
 def run_agent_loop(initial_question, agent, available_tools, max_iterations=10):
     """
     Automate the ReAct loop until the agent provides a final answer.
@@ -172,9 +498,6 @@ def run_agent_loop(initial_question, agent, available_tools, max_iterations=10):
     - available_tools: Dictionary mapping tool names to functions
     - max_iterations: Safety limit to prevent infinite loops
     """
-    # Regex to extract: Action: tool_name: input
-    action_pattern = re.compile(r'^Action: (\w+): (.*)$', re.MULTILINE)
-
     current_input = initial_question
     iteration = 0
 
@@ -185,36 +508,99 @@ def run_agent_loop(initial_question, agent, available_tools, max_iterations=10):
         response = agent(current_input)
         print(f"\n[Agent Response]\n{response}")
 
-        # Try to find an action in the response
-        action_match = action_pattern.search(response)
+        # Find every action in the response
+        actions = agent.actions(response)
 
-        if not action_match:
+        if not actions:
             # No action found, agent must have given a final answer
             print("\n[Complete] Agent has provided final answer.")
             return response
 
-        # Extract tool name and input
-        tool_name = action_match.group(1)
-        tool_input = action_match.group(2).strip()
-
-        # Check if tool exists
-        if tool_name not in available_tools:
-            print(f"\n[Error] Unknown tool: {tool_name}")
+        # Check that every tool exists
+        unknown = [name for name, _ in actions if name not in available_tools]
+        if unknown:
+            print(f"\n[Error] Unknown tool: {', '.join(unknown)}")
             return None
 
-        # Execute the tool
-        print(f"\n[Executing] {tool_name}({tool_input})")
-        tool_result = available_tools[tool_name](tool_input)
-        print(f"[Result] {tool_result}")
+        # Execute all requested tools at once
+        for tool_name, tool_input in actions:
+            print(f"\n[Executing] {tool_name}({tool_input})")
+        tool_results = run_tools(actions, available_tools)
+        for tool_result in tool_results:
+            print(f"[Result] {tool_result}")
 
         # Prepare next input for agent
-        current_input = f"Observation: {tool_result}"
+        current_input = agent.observation(actions, tool_results)
 
     print("[Timeout] Max iterations reached")
     return None
 
-travel_agent = Agent(system_prompt)
+async def arun_agent_loop(initial_question, agent, available_tools, max_iterations=10):
+    """Async version of run_agent_loop for an AsyncAgent; returns the final answer or None."""
+    current_input = initial_question
+
+    for _ in range(max_iterations):
+        response = await agent(current_input)
+        actions = agent.actions(response)
+        if not actions:
+            return response
+
+        if any(name not in available_tools for name, _ in actions):
+            return None
+
+        tool_results = await arun_tools(actions, available_tools)
+        current_input = agent.observation(actions, tool_results)
+
+    return None
+
+def make_agent(mode='text', asynchronous=False, tools=None):
+    """
+    Build an agent for one of the execution modes:
+    - 'text': the text protocol; parse_actions ignores anything after the action block
+    - 'stop': the text protocol, stopped server-side at STOP_SEQUENCES
+    - 'stream': the text protocol, streamed and cut off at the end of the action block
+    - 'tools': native tool calling with JSON-schema tools
+    """
+    if mode == 'tools':
+        cls = AsyncToolCallingAgent if asynchronous else ToolCallingAgent
+        return cls(tool_system_prompt, tools=tools)
+    if mode not in ('text', 'stop', 'stream'):
+        raise ValueError(f"unknown agent mode {mode!r}")
+    cls = AsyncAgent if asynchronous else Agent
+    return cls(system_prompt, stream=mode == 'stream', stop=STOP_SEQUENCES if mode == 'stop' else None)
+
+# REACT_AGENT_MODE=stop|stream|tools switches the example to another execution mode
+AGENT_MODE = os.getenv('REACT_AGENT_MODE', 'text')
+
+async def answer_all(questions, available_tools, max_iterations=10, mode=AGENT_MODE,
+                     max_concurrency=ANSWER_CONCURRENCY):
+    """
+    Answer many questions concurrently, each with its own async agent, with at
+    most `max_concurrency` in flight at once. Answers keep the questions' order.
+    """
+    slots = asyncio.Semaphore(max_concurrency)
+
+    async def answer(question):
+        async with slots:
+            return await arun_agent_loop(question, make_agent(mode, asynchronous=True), available_tools, max_iterations)
+
+    return await asyncio.gather(*(answer(q) for q in questions))
+
+def main():
+    travel_agent = make_agent(AGENT_MODE)
+
+    question = "What should I pack for a trip to Tokyo and where should I stay?"
+
+    run_agent_loop(question, travel_agent, available_tools)
+    export_from_env('react')
+
+    # questions = [
+    #     "What should I pack for a trip to Tokyo and where should I stay?",
+    #     "Plan a weekend in Paris on a budget.",
+    # ]
+    # for answer in asyncio.run(answer_all(questions, available_tools)):
+    #     print(answer, '\n')
 
-question = "What should I pack for a trip to Tokyo and where should I stay?"
 
-run_agent_loop(question, travel_agent, available_tools)
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,72 @@
+import sys
+import uuid
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
 from typing import Annotated, TypedDict
-from langchain_core.messages import HumanMessage
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph
-from langchain_openai import ChatOpenAI
 from dotenv import load_dotenv
 from langgraph.graph.message import add_messages
+from common.clients import Lazy, LazyModel, chat_model, tavily_client
+from common.deadline import CallPolicy, ResilientSearchClient, run_deadline
+from common.metrics import METRICS, InstrumentedSearchClient, MetricsCallbackHandler, export_from_env
+from common.streaming import StreamSink
 load_dotenv()
 
 class ConversationState(TypedDict):
     messages: Annotated[list, add_messages]
 
-llm = ChatOpenAI(
+# Built on first use, so importing this module needs no API key or network setup
+llm = LazyModel(lambda: chat_model(
     temperature=0.7,
     model='gpt-4o-mini',
-)
+    max_retries=0,
+))
+
+# Each chat turn must finish within this many seconds. Failures before the first
+# token are retried with jittered backoff inside that budget (instead of the SDK's retries)
+TURN_DEADLINE = 60
+llm_policy = CallPolicy("chat", retries=2)
+
+# Pass in a run's callbacks to time each node and LLM call (tokens, time-to-first-token, cost)
+metrics_handler = MetricsCallbackHandler()
 
 def dialogue_agent(state: ConversationState):
-    response_content = ""
-    print("Bot: ", end="", flush=True)
-    for chunk in llm.stream(state["messages"]):
+    # Tokens go out through the graph's custom stream; the node itself prints nothing
+    sink = StreamSink()
+    for chunk in llm_policy.stream(llm.stream, state["messages"]):
         if isinstance(chunk.content, str):
-            print(chunk.content, end="", flush=True)
-            response_content += chunk.content
-    print("\n")
+            sink.write(chunk.content)
+    return reply_update(sink)
 
-    from langchain_core.messages import AIMessage
-    return {"messages": [AIMessage(content=response_content)]}
+async def adialogue_agent(state: ConversationState):
+    # Async twin for ainvoke/astream (e.g. server.py), so a waiting reply holds no worker thread
+    sink = StreamSink()
+    async for chunk in llm_policy.astream(llm.astream, state["messages"]):
+        if isinstance(chunk.content, str):
+            sink.write(chunk.content)
+    return reply_update(sink)
+
+def reply_update(sink):
+    response_content = sink.close()
+
+    return {"messages": [AIMessage(
+        content=response_content,
+        response_metadata={"time_to_first_token": sink.time_to_first_token},
+    )]}
+
+def stream_reply(graph, inputs, config=None, deadline=TURN_DEADLINE):
+    """Print a reply token by token as the graph streams it, within `deadline` seconds."""
+    print("Bot: ", end="", flush=True)
+    with run_deadline(deadline):
+        for event in graph.stream(inputs, config=config, stream_mode="custom"):
+            if event["type"] == "token":
+                print(event["text"], end="", flush=True)
+            elif event["type"] == "done" and event["time_to_first_token"] is not None:
+                print(f"\n(first token after {event['time_to_first_token']:.2f}s)")
+    print()
 
 # chatbot_graph = (
 #     StateGraph(ConversationState)
@@ -72,8 +114,7 @@ def dialogue_agent(state: ConversationState):
 #             break
 
 #         messages.append(HumanMessage(content=user_input))
-#         for _ in chatbot_graph.stream({"messages": messages}):
-#             pass
+#         stream_reply(chatbot_graph, {"messages": messages})
 
 #     except KeyboardInterrupt:
 #         print("\n\nChatbot: Session interrupted. Goodbye!")
@@ -82,9 +123,14 @@ def dialogue_agent(state: ConversationState):
 #         print(f"Error: {e}\n")
 
 ##### Tavily AI
-from tavily import TavilyClient
+from common.search import CachedSearchClient
 
-client = TavilyClient()
+# Repeated queries are answered from .cache/search.sqlite instead of the network; a search
+# still running past its p95 latency gets a hedged duplicate (searches are cheap and idempotent)
+client = CachedSearchClient(ResilientSearchClient(
+    InstrumentedSearchClient(Lazy(tavily_client)), CallPolicy("search", hedge=True)
+))
+METRICS.track_cache('search', client.cache)
 
 # results = client.search(query='Latest developments in renewable energy 2025')
 # for result in results['results'][:3]:
@@ -99,6 +145,8 @@ client = TavilyClient()
 # print("Direct Answer:")
 # print(result['answer'])
 
+# print(f"Search cache: {client.stats()}")
+
 ##### Connect Tools to Your Agent
 # from langchain_tavily import TavilySearch
 # from langgraph.prebuilt import ToolNode, tools_condition
@@ -138,56 +186,78 @@ client = TavilyClient()
 # Checkpointing allows your agent to remember previous conversations
 # by persisting the state at each node execution
 
-from langgraph.checkpoint.memory import MemorySaver
+from common.cache import CACHE_DIR
+from common.checkpoint import DeltaSqliteSaver
 
-# Create an in-memory checkpointer
-checkpointer = MemorySaver()
+# Create a durable checkpointer: conversations survive restarts, and each step
+# stores only the messages it added instead of a full copy of the history
+checkpointer = DeltaSqliteSaver(CACHE_DIR / "chatbot-checkpoints.sqlite")
+
+# For a long-running process with many users, a bounded in-memory store keeps
+# the hot threads in RAM and spills the rest to disk (see server.py --checkpointer):
+# from common.memory_saver import BoundedMemorySaver, ThreadSpill
+# checkpointer = BoundedMemorySaver(max_threads=1_000, idle_ttl=3600, spill=ThreadSpill(CACHE_DIR / "chat-spill.sqlite"))
 
 # Rebuild the graph with checkpointing enabled
 chatbot_graph_with_memory = (
     StateGraph(ConversationState)
-    .add_node("agent", dialogue_agent)
+    .add_node("agent", RunnableLambda(dialogue_agent, adialogue_agent, name="agent"))
     .set_entry_point("agent")
     .set_finish_point("agent")
     .compile(checkpointer=checkpointer)
 )
 
-# Example: Using thread_id to maintain separate conversations
-# Each thread_id maintains its own conversation history
-
-# Conversation 1 (thread_id="user_1")
-print("=== Conversation 1 (User 1) ===")
-response_1 = chatbot_graph_with_memory.invoke(
-    {"messages": [HumanMessage(content="What is machine learning? shortly in 100 chars.")]},
-    config={"configurable": {"thread_id": "user_1"}}
-)
-
-# Conversation 2 (thread_id="user_2") - separate conversation history
-print("=== Conversation 2 (User 2) ===")
-response_2 = chatbot_graph_with_memory.invoke(
-    {"messages": [HumanMessage(content="Tell me about quantum computing. shortly in 100 chars.")]},
-    config={"configurable": {"thread_id": "user_2"}}
-)
-
-# Continue the same conversation (same thread_id)
-print("=== Conversation 1 (User 1) ===")
-response_3 = chatbot_graph_with_memory.invoke(
-    {"messages": [HumanMessage(content="Can you explain neural networks? shortly in 100 chars.")]},
-    config={"configurable": {"thread_id": "user_1"}}
-)
-
-##### Check What Your Agent Remembers
-# Use get_state() to retrieve the conversation history and next steps
-print("\n=== Agent Memory State (User 1) ===")
-state_snapshot = chatbot_graph_with_memory.get_state(
-    config={"configurable": {"thread_id": "user_1"}}
-)
-print(f"Last message: {state_snapshot.values['messages'][-1]}")
-print(f"Next step: {state_snapshot.next}")
-
-print("\n=== Agent Memory State (User 2) ===")
-state_snapshot = chatbot_graph_with_memory.get_state(
-    config={"configurable": {"thread_id": "user_2"}}
-)
-print(f"Last message: {state_snapshot.values['messages'][-1]}")
-print(f"Next step: {state_snapshot.next}")
+def main():
+    checkpointer.start_compaction()
+
+    # Example: Using thread_id to maintain separate conversations
+    # Each thread_id maintains its own conversation history. The checkpointer is
+    # durable, so fresh ids keep each demo run from extending the previous one's threads.
+    run = uuid.uuid4().hex[:8]
+    user_1, user_2 = f"user_1-{run}", f"user_2-{run}"
+
+    # Conversation 1 (thread_id="user_1")
+    print("=== Conversation 1 (User 1) ===")
+    stream_reply(
+        chatbot_graph_with_memory,
+        {"messages": [HumanMessage(content="What is machine learning? shortly in 100 chars.")]},
+        config={"configurable": {"thread_id": user_1}, "callbacks": [metrics_handler]}
+    )
+
+    # Conversation 2 (thread_id="user_2") - separate conversation history
+    print("=== Conversation 2 (User 2) ===")
+    stream_reply(
+        chatbot_graph_with_memory,
+        {"messages": [HumanMessage(content="Tell me about quantum computing. shortly in 100 chars.")]},
+        config={"configurable": {"thread_id": user_2}, "callbacks": [metrics_handler]}
+    )
+
+    # Continue the same conversation (same thread_id)
+    print("=== Conversation 1 (User 1) ===")
+    stream_reply(
+        chatbot_graph_with_memory,
+        {"messages": [HumanMessage(content="Can you explain neural networks? shortly in 100 chars.")]},
+        config={"configurable": {"thread_id": user_1}, "callbacks": [metrics_handler]}
+    )
+
+    ##### Check What Your Agent Remembers
+    # Use get_state() to retrieve the conversation history and next steps
+    print("\n=== Agent Memory State (User 1) ===")
+    state_snapshot = chatbot_graph_with_memory.get_state(
+        config={"configurable": {"thread_id": user_1}}
+    )
+    print(f"Last message: {state_snapshot.values['messages'][-1]}")
+    print(f"Next step: {state_snapshot.next}")
+
+    print("\n=== Agent Memory State (User 2) ===")
+    state_snapshot = chatbot_graph_with_memory.get_state(
+        config={"configurable": {"thread_id": user_2}}
+    )
+    print(f"Last message: {state_snapshot.values['messages'][-1]}")
+    print(f"Next step: {state_snapshot.next}")
+
+    export_from_env('langgraph')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""
+Async HTTP front end for the checkpointed chatbot, streaming replies as
+server-sent events.
+
+    python 02-building-with-langgraph/server.py --port 8000
+
+    curl -N localhost:8000/chat -d '{"thread_id": "user_1", "message": "Hi!"}'
+
+Endpoints:
+- POST /chat {"thread_id", "message"}: streams `token` events, then one `done` event
+- GET /threads/<thread_id>: the conversation stored for that thread
+- GET /health: load counters
+
+Turns on the same thread_id run one after another, so the checkpoint
+history stays linear. Across threads, at most `max_active` turns run at once.
+Up to `max_waiting` more may queue, and beyond that the server answers 503
+right away instead of letting latency grow without bound. Each SSE write
+waits for the socket to drain, so a slow reader can't pile tokens up in memory.
+A turn that runs past `deadline` seconds ends with an `error` event.
+
+By default threads are checkpointed to SQLite. `--checkpointer memory` keeps
+them in a BoundedMemorySaver instead: least recently used and idle threads
+are spilled to disk once the thread or byte limit is reached, and reloaded
+when their user comes back, so memory stays flat however many users show up.
+"""
+import argparse
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from langchain_core.messages import HumanMessage
+
+from common.cache import CACHE_DIR
+from common.deadline import run_deadline
+from common.examples import load_example
+from common.memory_saver import BoundedMemorySaver, ThreadSpill
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 503: "Service Unavailable"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+async def read_request(reader, max_body=1_000_000):
+    """Parse one HTTP/1.1 request into (method, path, body bytes)."""
+    request_line = await reader.readline()
+    if not request_line:
+        raise ConnectionResetError
+    try:
+        method, path, _ = request_line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "malformed request line")
+
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get("content-length") or 0)
+    if length > max_body:
+        raise HTTPError(400, "request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method, path, body
+
+
+def response_head(status, content_type, extra=""):
+    return (
+        f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Connection: close\r\n{extra}\r\n"
+    ).encode("latin-1")
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+
+
+class ChatServer:
+    """Serves one compiled chat graph to many threads at once over asyncio streams."""
+
+    def __init__(self, graph, max_active=64, max_waiting=256, config=None, deadline=None):
+        self.graph = graph
+        self.config = config or {}
+        self.deadline = deadline
+        self.max_waiting = max_waiting
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.completed = 0
+        self._slots = asyncio.Semaphore(max_active)
+        # thread_id -> [lock, users]; dropped once nobody holds or waits for it
+        self._threads = {}
+
+    def thread_config(self, thread_id):
+        return {**self.config, "configurable": {**self.config.get("configurable", {}), "thread_id": thread_id}}
+
+    async def handle(self, reader, writer):
+        try:
+            method, path, body = await read_request(reader)
+            if path == "/chat":
+                if method != "POST":
+                    raise HTTPError(405, "use POST")
+                await self.chat(body, writer)
+            elif path.startswith("/threads/") and method == "GET":
+                await self.send_json(writer, 200, await self.thread(path.removeprefix("/threads/")))
+            elif path == "/health":
+                await self.send_json(writer, 200, self.stats())
+            else:
+                raise HTTPError(404, f"no route for {path}")
+        except HTTPError as e:
+            await self.send_json(writer, e.status, {"error": str(e)})
+        except (ConnectionResetError, BrokenPipeError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionResetError, BrokenPipeError):
+                pass
+
+    async def send_json(self, writer, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        writer.write(response_head(status, "application/json", f"Content-Length: {len(body)}\r\n") + body)
+        await writer.drain()
+
+    async def chat(self, body, writer):
+        try:
+            request = json.loads(body)
+            thread_id, message = str(request["thread_id"]), str(request["message"])
+        except (ValueError, KeyError, TypeError):
+            raise HTTPError(400, 'expected JSON {"thread_id": ..., "message": ...}')
+
+        if self.waiting >= self.max_waiting:
+            self.rejected += 1
+            raise HTTPError(503, "server busy, retry later")
+
+        entry = self._threads.setdefault(thread_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        self.waiting += 1
+        queued = True
+        try:
+            async with entry[0], self._slots:
+                self.waiting -= 1
+                queued = False
+                self.active += 1
+                try:
+                    await self.stream_turn(thread_id, message, writer)
+                finally:
+                    self.active -= 1
+        finally:
+            if queued:
+                self.waiting -= 1
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._threads[thread_id]
+
+    async def stream_turn(self, thread_id, message, writer):
+        writer.write(response_head(200, "text/event-stream", "Cache-Control: no-cache\r\n"))
+        inputs = {"messages": [HumanMessage(content=message)]}
+        try:
+            with run_deadline(self.deadline):
+                async for event in self.graph.astream(inputs, self.thread_config(thread_id), stream_mode="custom"):
+                    if event["type"] == "token":
+                        writer.write(sse("token", {"text": event["text"]}))
+                    elif event["type"] == "done":
+                        writer.write(sse("done", {
+                            "time_to_first_token": event["time_to_first_token"],
+                            "total_time": event["total_time"],
+                        }))
+                    # Backpressure: don't pull more tokens than the client has read
+                    await writer.drain()
+        except (ConnectionResetError, BrokenPipeError):
+            raise
+        except Exception as e:
+            writer.write(sse("error", {"error": str(e)}))
+            await writer.drain()
+            return
+        self.completed += 1
+
+    async def thread(self, thread_id):
+        snapshot = await self.graph.aget_state(self.thread_config(thread_id))
+        messages = snapshot.values.get("messages", [])
+        if not messages:
+            raise HTTPError(404, f"unknown thread {thread_id}")
+        return {
+            "thread_id": thread_id,
+            "messages": [{"role": m.type, "content": m.content} for m in messages],
+        }
+
+    def stats(self):
+        stats = {
+            "active": self.active,
+            "waiting": self.waiting,
+            "threads": len(self._threads),
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+        if isinstance(self.graph.checkpointer, BoundedMemorySaver):
+            stats["memory"] = self.graph.checkpointer.stats()
+        return stats
+
+    async def start(self, host="127.0.0.1", port=8000):
+        return await asyncio.start_server(self.handle, host, port, limit=2 ** 16)
+
+
+async def evict_idle(saver, interval):
+    """Evict idle threads even when no new turns arrive to trigger it."""
+    while True:
+        await asyncio.sleep(interval)
+        saver.evict_idle()
+
+
+async def serve(host, port, max_active, max_waiting, checkpointer="sqlite", max_threads=1_000,
+                max_memory_mb=256, idle_ttl=None, deadline=None):
+    chatbot = load_example("langgraph")
+    if checkpointer == "memory":
+        saver = BoundedMemorySaver(
+            max_threads=max_threads, max_bytes=max_memory_mb * 2 ** 20, idle_ttl=idle_ttl,
+            spill=ThreadSpill(CACHE_DIR / "chat-spill.sqlite"),
+        )
+        chatbot.chatbot_graph_with_memory.checkpointer = saver
+        if idle_ttl:
+            asyncio.create_task(evict_idle(saver, idle_ttl / 2))
+    else:
+        chatbot.checkpointer.start_compaction()
+    server = ChatServer(
+        chatbot.chatbot_graph_with_memory, max_active=max_active, max_waiting=max_waiting,
+        config={"callbacks": [chatbot.metrics_handler]},
+        deadline=chatbot.TURN_DEADLINE if deadline is None else deadline,
+    )
+    listener = await server.start(host, port)
+    print(f"Serving chat on http://{host}:{port}")
+    async with listener:
+        await listener.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-active", type=int, default=64, help="turns streaming at once")
+    parser.add_argument("--max-waiting", type=int, default=256, help="queued turns before answering 503")
+    parser.add_argument("--deadline", type=float, help="seconds a turn may take (default: the chatbot's TURN_DEADLINE)")
+    parser.add_argument("--checkpointer", choices=["sqlite", "memory"], default="sqlite")
+    parser.add_argument("--max-threads", type=int, default=1_000, help="threads kept in memory (memory checkpointer)")
+    parser.add_argument("--max-memory-mb", type=int, default=256, help="checkpoint bytes kept in memory (memory checkpointer)")
+    parser.add_argument("--idle-ttl", type=float, help="seconds before an idle thread is spilled (memory checkpointer)")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(
+            args.host, args.port, args.max_active, args.max_waiting,
+            args.checkpointer, args.max_threads, args.max_memory_mb, args.idle_ttl, args.deadline,
+        ))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
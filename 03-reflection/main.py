@@ -1,75 +1,233 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import operator
+import re
 from typing import Annotated, TypedDict
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
 from langgraph.graph.message import add_messages
 from dotenv import load_dotenv
+from common.convergence import CallBudget, ConvergenceDetector, CritiqueSeverity, DraftDelta, add_usage, call_usage
 load_dotenv()
 
 class State(TypedDict):
     messages: Annotated[list[BaseMessage], add_messages]
+    # Role-swapped transcript for the critic, extended by one message per node
+    critique_view: Annotated[list[BaseMessage], add_messages]
+    # One-line gist of each critique, used to summarize older rounds
+    critique_gists: Annotated[list[str], operator.add]
+    # LLM calls and tokens spent so far in this run
+    usage: Annotated[dict, add_usage]
+    # Why the loop ended ('' while it is still running)
+    stop_reason: str
+
+# What each chain sees of the draft/critique history:
+# - "full": the whole transcript (grows every round)
+# - "window": the original request, the latest draft and the latest critique
+# - "summary": like "window", plus a short recap of the feedback from older rounds
+HISTORY_MODE = "window"
+
+# Stop revising once drafts barely change, the critic only asks for polish, or the run's budget is spent
+convergence = ConvergenceDetector([
+    DraftDelta(min_change=0.05),
+    CritiqueSeverity(threshold=0.2),
+    CallBudget(max_llm_calls=12, max_tokens=30_000),
+])
 
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_openai import ChatOpenAI
+from langchain_core.runnables import RunnableLambda
+from common.clients import LazyModel, chat_model
+from common.deadline import CallPolicy, resilient, run_deadline, with_deadline
+from common.metrics import MetricsCallbackHandler, export_from_env
+from common.ratelimit import RateLimiter, rate_limited
+from common.routing import ModelRouter, NodeProfile, Tier
+
+# One limiter shared by both chains (and every run in a batch), sized to the account's limits
+rate_limiter = RateLimiter(requests_per_minute=500, tokens_per_minute=200_000)
+
+# Runs in flight at once in run_batch; the limiter, not this cap, should be what paces them
+BATCH_CONCURRENCY = 32
+
+# Each run must finish within this many seconds. LLM calls are retried with jittered
+# backoff inside that budget (instead of the SDK's retries).
+RUN_DEADLINE = 120
+# Hedging sends a duplicate request when a call runs past its p95 latency. That cuts
+# tail latency at the cost of a few percent more calls (see call_hedge_wins_total).
+HEDGE_LLM = False
+llm_policy = CallPolicy("llm", retries=3, hedge=HEDGE_LLM)
+
+# The critique is short and gates the next draft, so it prefers the fast tier; drafting
+# prefers the stronger one. A tier whose recent median latency is over a node's budget
+# (seconds) is tried last, and a failing tier falls back to the other.
+router = ModelRouter(
+    {
+        "fast": Tier(rate_limited(LazyModel(lambda: chat_model(model='gpt-4.1-nano', max_retries=0)), rate_limiter)),
+        "standard": Tier(rate_limited(LazyModel(lambda: chat_model(model='gpt-4o-mini', max_retries=0)), rate_limiter)),
+    },
+    {
+        "generate": NodeProfile(["standard", "fast"], latency_budget=10),
+        "critique": NodeProfile(["fast", "standard"], latency_budget=4),
+    },
+)
+
+# Pass in a run's callbacks to time each node and LLM call (tokens, cost)
+metrics_handler = MetricsCallbackHandler()
 
 # Generator chain
 generation_prompt = ChatPromptTemplate.from_messages([
     ("system", "Write a compelling LinkedIn post. Be specific. Use concrete details. Show impact."),
     MessagesPlaceholder(variable_name='messages'),
 ])
-generate_chain = generation_prompt | ChatOpenAI(model='gpt-4o-mini')
+generate_chain = generation_prompt | resilient(router.runnable("generate"), llm_policy)
 
 # Critique chain
 critique_prompt = ChatPromptTemplate.from_messages([
     ("system", "Review the LinkedIn post. Identify what makes it weak. Point out missing details, unclear sections, and areas lacking specificity."),
     MessagesPlaceholder(variable_name='messages'),
 ])
-critique_chain = critique_prompt | ChatOpenAI(model='gpt-4o-mini')
+critique_chain = critique_prompt | resilient(router.runnable("critique"), llm_policy)
+
+def gist(text, limit=200):
+    """First sentence of a critique, trimmed to `limit` characters."""
+    first = re.split(r'(?<=[.!?])\s', text.strip(), maxsplit=1)[0]
+    return first[:limit]
+
+def windowed(history, gists):
+    """Trim a transcript according to HISTORY_MODE: request + latest two turns (+ recap)."""
+    if HISTORY_MODE == "full" or len(history) <= 3:
+        return history
+
+    window = [history[0]]
+    # The latest critique is always one of the last two turns, so only older ones are recapped
+    older = gists[:-1]
+    if HISTORY_MODE == "summary" and older:
+        recap = "\n".join(f"- {g}" for g in older)
+        window.append(HumanMessage(content=f"Feedback from earlier rounds:\n{recap}"))
+    return window + history[-2:]
+
+def generation_input(state: State) -> dict:
+    return {"messages": windowed(state["messages"], state.get("critique_gists", []))}
+
+def latest_draft(messages):
+    return next((m.content for m in reversed(messages) if isinstance(m, AIMessage)), None)
+
+def generation_update(state: State, ai_msg) -> dict:
+    # Keep the critic's role-swapped view in step: the new draft arrives as the "user" turn
+    view_update = [] if state.get("critique_view") else [state["messages"][0]]
+    view_update.append(HumanMessage(content=ai_msg.content))
+
+    usage = call_usage(ai_msg)
+    stop_reason = convergence.check(
+        draft=ai_msg.content,
+        previous_draft=latest_draft(state["messages"]),
+        usage=add_usage(state.get("usage"), usage),
+    )
+    if not stop_reason and len(state["messages"]) + 1 > MAX_ITERATIONS:
+        stop_reason = f"reached MAX_ITERATIONS ({MAX_ITERATIONS})"
+    return {"messages": [ai_msg], "critique_view": view_update, "usage": usage, "stop_reason": stop_reason}
 
 def generation_node(state: State) -> dict:
     """Generate or revise the post from current message history."""
-    ai_msg = generate_chain.invoke({"messages": state["messages"]})
-    return {"messages": [ai_msg]}
+    return generation_update(state, generate_chain.invoke(generation_input(state)))
 
-def critique_node(state: State) -> dict:
-    """Critique the post. Return feedback as a HumanMessage."""
-    msgs = state["messages"]
+async def ageneration_node(state: State) -> dict:
+    return generation_update(state, await generate_chain.ainvoke(generation_input(state)))
 
+def critique_input(state: State) -> dict:
     # Role swap: treat the model's own output as something to critique
-    cls_map = {"ai": HumanMessage, "human": AIMessage}
-    translated = [msgs[0]] + [cls_map[m.type](content=m.content) for m in msgs[1:]]
+    return {"messages": windowed(state["critique_view"], state.get("critique_gists", []))}
 
-    # Get the critique
-    feedback = critique_chain.invoke({"messages": translated})
+def critique_update(state: State, feedback) -> dict:
+    usage = call_usage(feedback)
+    stop_reason = convergence.check(critique=feedback.content, usage=add_usage(state.get("usage"), usage))
 
     # Return as HumanMessage so the generator sees it as user feedback
-    return {"messages": [HumanMessage(content=feedback.content)]}
+    return {
+        "messages": [HumanMessage(content=feedback.content)],
+        "critique_view": [AIMessage(content=feedback.content)],
+        "critique_gists": [gist(feedback.content)],
+        "usage": usage,
+        "stop_reason": stop_reason,
+    }
+
+def critique_node(state: State) -> dict:
+    """Critique the post. Return feedback as a HumanMessage."""
+    return critique_update(state, critique_chain.invoke(critique_input(state)))
+
+async def acritique_node(state: State) -> dict:
+    return critique_update(state, await critique_chain.ainvoke(critique_input(state)))
 
 MAX_ITERATIONS = 3
 
 def should_continue(state: State):
-    if len(state["messages"]) > MAX_ITERATIONS:
+    if state.get("stop_reason"):
         return END
     return "critique"
 
+def after_critique(state: State):
+    # A critique asking only for polish ends the run with the current draft
+    if state.get("stop_reason"):
+        return END
+    return "generate"
+
 from langgraph.graph import StateGraph, END
 
 builder = StateGraph(state_schema=State)
-builder.add_node("generate", generation_node)
-builder.add_node("critique", critique_node)
+# Each node has an async twin, so abatch runs don't each tie up a worker thread
+builder.add_node("generate", RunnableLambda(generation_node, ageneration_node, name="generate"))
+builder.add_node("critique", RunnableLambda(critique_node, acritique_node, name="critique"))
 
 builder.set_entry_point("generate")
 builder.add_conditional_edges("generate", should_continue)
-builder.add_edge("critique", "generate")
+builder.add_conditional_edges("critique", after_critique)
 
 graph = builder.compile()
 
-from langchain_core.messages import HumanMessage
-
-inputs: State = {"messages": [HumanMessage(content="Write a LinkedIn post about shipping an API caching layer")]}
-
-for event in graph.stream(input=inputs):
-    for node, state in event.items():
-        for msg in state["messages"]:
-            if isinstance(msg, AIMessage):
-                print(f"\n--- {node} ---")
-                print(msg.content)
-                print("\n" + "-" * 80 + "\n")
+def batch_inputs(prompts) -> list[State]:
+    return [{"messages": [HumanMessage(content=prompt)]} for prompt in prompts]
+
+def run_batch(prompts, max_concurrency=BATCH_CONCURRENCY):
+    """
+    Run many prompts through the graph, yielding (index, final_state) as each
+    run finishes. A failed run yields its exception instead of stopping the batch.
+    Each run gets its own RUN_DEADLINE.
+    """
+    config = {"max_concurrency": max_concurrency, "callbacks": [metrics_handler]}
+    runs = with_deadline(graph, RUN_DEADLINE)
+    yield from runs.batch_as_completed(batch_inputs(prompts), config, return_exceptions=True)
+
+async def arun_batch(prompts, max_concurrency=BATCH_CONCURRENCY):
+    """Async version of run_batch; all runs share one event loop instead of a thread each."""
+    config = {"max_concurrency": max_concurrency, "callbacks": [metrics_handler]}
+    runs = with_deadline(graph, RUN_DEADLINE)
+    async for index, result in runs.abatch_as_completed(batch_inputs(prompts), config, return_exceptions=True):
+        yield index, result
+
+def main():
+    inputs: State = {"messages": [HumanMessage(content="Write a LinkedIn post about shipping an API caching layer")]}
+
+    with run_deadline(RUN_DEADLINE):
+        for event in graph.stream(input=inputs, config={"callbacks": [metrics_handler]}):
+            for node, state in event.items():
+                for msg in state["messages"]:
+                    if isinstance(msg, AIMessage):
+                        print(f"\n--- {node} ---")
+                        print(msg.content)
+                        print("\n" + "-" * 80 + "\n")
+                if state.get("stop_reason"):
+                    print(f"[Stopped] {state['stop_reason']}")
+
+    export_from_env('reflection')
+
+    # import asyncio
+    # topics = ["an API caching layer", "a zero-downtime migration", "an on-call rotation revamp"]
+    # async def batch_demo():
+    #     async for index, result in arun_batch([f"Write a LinkedIn post about {t}" for t in topics]):
+    #         print(f"[{index}]", result if isinstance(result, Exception) else result["messages"][-1].content[:80])
+    #     print(f"Rate limiter: {rate_limiter.stats()}")
+    # asyncio.run(batch_demo())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,115 @@
+import sys
+import uuid
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
 from dotenv import load_dotenv
 load_dotenv()
 
 from langchain_core.messages import SystemMessage, HumanMessage
 from langchain_core.runnables import RunnableConfig
-from langchain_openai import ChatOpenAI
-from typing import TypedDict, List
-from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.memory import MemorySaver
-
-model = ChatOpenAI(model='gpt-4o-mini', temperature=0)
-
-from tavily import TavilyClient
-
-tavily = TavilyClient()
+from typing import Annotated, TypedDict, List
+from langgraph.graph import StateGraph, START, END
+
+from common.blobs import BlobStore
+from common.cache import CACHE_DIR
+from common.clients import Lazy, LazyModel, chat_model, tavily_client
+from common.checkpoint import DeltaSqliteSaver
+from common.deadline import CallPolicy, ResilientSearchClient, run_deadline
+from common.convergence import CallBudget, ConvergenceDetector, CritiqueSeverity, DraftDelta, add_usage, call_usage
+from common.llm_cache import ResponseCache
+from common.metrics import METRICS, InstrumentedSearchClient, MetricsCallbackHandler, export_from_env
+from common.routing import ModelRouter, NodeProfile, Tier
+
+# temperature=0 is deterministic, so identical prompts are answered from .cache/llm.sqlite
+response_cache = ResponseCache()
+# Built on first use over the shared connection pool
+model = LazyModel(lambda: chat_model(
+    model='gpt-4o-mini', temperature=0, max_retries=0, cache=response_cache.for_chat_model(0)
+))
+fast_model = LazyModel(lambda: chat_model(
+    model='gpt-4.1-nano', temperature=0, max_retries=0, cache=response_cache.for_chat_model(0)
+))
+
+# Query writing and review are short and sit on the critical path, so they prefer the fast
+# tier; planning and writing prefer the stronger one. A tier whose recent median latency is
+# over a node's budget (seconds) is tried last, and a failing tier falls back to the other.
+router = ModelRouter(
+    {
+        "fast": Tier(fast_model, max_prompt_tokens=4_000),
+        "standard": Tier(model),
+    },
+    {
+        "plan": NodeProfile(["standard", "fast"], latency_budget=15),
+        "research_plan": NodeProfile(["fast", "standard"], latency_budget=3),
+        "write": NodeProfile(["standard", "fast"], latency_budget=30),
+        "review": NodeProfile(["fast", "standard"], latency_budget=8),
+        "research_critique": NodeProfile(["fast", "standard"], latency_budget=3),
+    },
+)
+
+# Each run must finish within this many seconds. LLM calls and searches are retried with
+# jittered backoff inside that budget (instead of the SDKs' retries), and a search still
+# running past its p95 latency gets a hedged duplicate, since searches are cheap and idempotent.
+RUN_DEADLINE = 300
+llm_policy = CallPolicy("llm", retries=3)
+search_policy = CallPolicy("search", retries=2, hedge=True)
+
+# Pass in a run's callbacks to time each node and LLM call (tokens, cost)
+metrics_handler = MetricsCallbackHandler()
+
+from common.search import CachedSearchClient, SearchExecutor
+from common.compress import ExtractiveCompressor
+from common.queries import EMPTY_LOG, merge_query_log, novel_queries
+from common.sources import SourceStore, add_sources
+
+SEARCH_CONCURRENCY = 3
+
+# One pooled, disk-cached client shared by both research nodes, queried concurrently
+tavily = CachedSearchClient(ResilientSearchClient(
+    InstrumentedSearchClient(Lazy(lambda: tavily_client(SEARCH_CONCURRENCY))), search_policy
+))
+METRICS.track_cache('llm', response_cache.cache)
+METRICS.track_cache('search', tavily.cache)
+search = SearchExecutor(tavily, max_workers=SEARCH_CONCURRENCY)
+
+# The writer only sees the best-matching passages, so its prompt stays flat across revisions
+SOURCE_TOP_K = 8
+SOURCE_TOKEN_BUDGET = 1500
+source_store = SourceStore()
+
+# ...and only their sentences closest to the topic and outline (TF-IDF, no extra LLM call)
+SOURCE_COMPRESSION_RATIO = 0.5
+compressor = ExtractiveCompressor(ratio=SOURCE_COMPRESSION_RATIO)
+
+# Source texts, drafts and reviews live here; the state (and so every checkpoint) only holds their refs
+blobs = BlobStore(CACHE_DIR / "reflexion-blobs.sqlite")
+
+# Queries at least this similar (shingle Jaccard) to one already searched this run are skipped
+QUERY_SIMILARITY = 0.6
+
+# Stop revising once the essay barely changes, the review only asks for polish, or the run's budget is spent
+convergence = ConvergenceDetector([
+    DraftDelta(min_change=0.05),
+    CritiqueSeverity(threshold=0.2),
+    CallBudget(max_llm_calls=20, max_tokens=100_000),
+])
 
 class WriterState(TypedDict):
     topic: str
     outline: str
+    # Refs into `blobs` (read them with blobs.get); identical sources share a ref, so add_sources drops repeats
     output: str
     feedback: str
-    sources: List[str]
+    sources: Annotated[List[str], add_sources]  # pass None to start from no sources
     iteration: int
     total_iterations: int
+    # LLM calls and tokens spent so far in this run (pass None to start counting afresh)
+    usage: Annotated[dict, add_usage]
+    # Why the loop ended ('' while it is still running)
+    stop_reason: str
+    # Queries searched this run and how many near-duplicates were skipped (pass None to reset)
+    query_log: Annotated[dict, merge_query_log]
 
 PLAN_PROMPT = """You are an expert writer. Create a detailed outline for an essay on the given topic.
 Include main sections and key points to cover."""
@@ -52,69 +140,90 @@ def plan_node(state: WriterState):
         SystemMessage(content=PLAN_PROMPT),
         HumanMessage(content=state['topic'])
     ]
-    response = model.invoke(messages)
-    return {"outline": response.content}
-
-def research_plan_node(state: WriterState):
-    """Generate search queries based on topic."""
-    queries = model.with_structured_output(Queries).invoke([
-        SystemMessage(content=RESEARCH_PROMPT),
-        HumanMessage(content=state['topic'])
-    ])
-
-    sources = state.get('sources', [])
-    for q in queries.queries:
-        response = tavily.search(query=q, max_results=2)
+    response = llm_policy.call(router.invoke, 'plan', messages)
+    return {"outline": response.content, "usage": call_usage(response)}
+
+def research(state: WriterState, node, prompt, request):
+    """Generate queries for `request`, then search the ones not already covered this run."""
+    queries = llm_policy.call(router.invoke, node, [
+        SystemMessage(content=prompt),
+        HumanMessage(content=request)
+    ], schema=Queries)
+    searched = (state.get('query_log') or EMPTY_LOG)['searched']
+    fresh, skipped = novel_queries(queries.queries, searched, QUERY_SIMILARITY)
+
+    sources = []
+    for response in search.search_many(fresh, max_results=2):
         for r in response['results']:
             sources.append(r['content'])
 
-    return {"sources": sources}
+    return {
+        "sources": blobs.put_many(sources),
+        "query_log": {"searched": fresh, "saved": len(skipped)},
+        "usage": call_usage(queries, prompt + request),
+    }
+
+def research_plan_node(state: WriterState):
+    """Generate search queries based on topic."""
+    return research(state, 'research_plan', RESEARCH_PROMPT, state['topic'])
 
 def write_node(state: WriterState):
     """Write or revise the essay."""
-    content = "\n\n".join(state['sources'] or [])
+    query = "\n".join([state['topic'], state['outline'], blobs.get(state.get('feedback'))])
+    passages = source_store.top_passages(
+        blobs.get_many(state['sources'] or []), query, k=SOURCE_TOP_K, token_budget=SOURCE_TOKEN_BUDGET
+    )
+    content = "\n\n".join(compressor.compress(passages, query))
 
     messages = [
         SystemMessage(content=WRITER_PROMPT.format(content=content)),
         HumanMessage(content=f"{state['topic']}\n\nOutline:\n{state['outline']}")
     ]
 
-    response = model.invoke(messages)
+    response = llm_policy.call(router.invoke, 'write', messages)
+    usage = call_usage(response)
+    iteration = state.get("iteration", 0) + 1
+    stop_reason = convergence.check(
+        draft=response.content,
+        previous_draft=blobs.get(state.get('output')),
+        usage=add_usage(state.get('usage'), usage),
+    )
+    if not stop_reason and iteration > state['total_iterations']:
+        stop_reason = f"reached total_iterations ({state['total_iterations']})"
     return {
-        "output": response.content,
-        "iteration": state.get("iteration", 0) + 1
+        "output": blobs.put(response.content),
+        "iteration": iteration,
+        "usage": usage,
+        "stop_reason": stop_reason,
     }
 
 def review_node(state: WriterState):
     """Critique the essay."""
     messages = [
         SystemMessage(content=REVIEW_PROMPT),
-        HumanMessage(content=state['output'])
+        HumanMessage(content=blobs.get(state['output']))
     ]
-    response = model.invoke(messages)
-    return {"feedback": response.content}
+    response = llm_policy.call(router.invoke, 'review', messages)
+    usage = call_usage(response)
+    stop_reason = convergence.check(critique=response.content, usage=add_usage(state.get('usage'), usage))
+    return {"feedback": blobs.put(response.content), "usage": usage, "stop_reason": stop_reason}
 
 def research_critique_node(state: WriterState):
     """Search for information to address critique."""
-    queries = model.with_structured_output(Queries).invoke([
-        SystemMessage(content=RESEARCH_CRITIQUE_PROMPT),
-        HumanMessage(content=state['feedback'])
-    ])
-
-    sources = state.get('sources', [])
-    for q in queries.queries:
-        response = tavily.search(query=q, max_results=2)
-        for r in response['results']:
-            sources.append(r['content'])
-
-    return {"sources": sources}
+    return research(state, 'research_critique', RESEARCH_CRITIQUE_PROMPT, blobs.get(state['feedback']))
 
 def should_continue(state: WriterState):
-    """Stop if we've hit max iterations."""
-    if state['iteration'] > state['total_iterations']:
+    """Stop once write_node has recorded a reason (converged, over budget or out of iterations)."""
+    if state.get('stop_reason'):
         return END
     return 'review'
 
+def after_review(state: WriterState):
+    """A review asking only for polish ends the run with the current essay."""
+    if state.get('stop_reason'):
+        return END
+    return 'research_critique'
+
 builder = StateGraph(WriterState)
 
 builder.add_node('plan', plan_node)
@@ -123,34 +232,58 @@ builder.add_node('write', write_node)
 builder.add_node('review', review_node)
 builder.add_node('research_critique', research_critique_node)
 
-builder.set_entry_point('plan')
-
-builder.add_edge('plan', 'research_plan')
-builder.add_edge('research_plan', 'write')
+# plan and research_plan only need the topic, so they run side by side and write waits for both.
+# They write disjoint keys (outline vs sources); usage is summed by its reducer.
+builder.add_edge(START, 'plan')
+builder.add_edge(START, 'research_plan')
+builder.add_edge(['plan', 'research_plan'], 'write')
 builder.add_conditional_edges('write', should_continue)
 
-builder.add_edge('review', 'research_critique')
+builder.add_conditional_edges('review', after_review)
 builder.add_edge('research_critique', 'write')
 
-graph = builder.compile(checkpointer=MemorySaver())
+# Sources grow every round; the delta checkpointer stores only the new ones per step,
+# and its compaction drops the blobs no remaining checkpoint refers to
+checkpointer = DeltaSqliteSaver(CACHE_DIR / "reflexion-checkpoints.sqlite", blobs=blobs)
+graph = builder.compile(checkpointer=checkpointer)
+
+def main():
+    checkpointer.start_compaction()
+
+    # The checkpointer is durable, so each run gets its own thread instead of extending an earlier one
+    thread: RunnableConfig = {
+        'configurable': {'thread_id': f'essay-{uuid.uuid4().hex[:8]}'},
+        'callbacks': [metrics_handler],
+    }
+
+    inputs: WriterState = {
+        'topic': 'The impact of renewable energy on climate change',
+        'total_iterations': 2,
+        'iteration': 1,
+        'sources': None,
+        'outline': '',
+        'output': '',
+        'feedback': '',
+        'usage': None,
+        'stop_reason': '',
+        'query_log': None
+    }
+
+    with run_deadline(RUN_DEADLINE):
+        for event in graph.stream(inputs, thread):
+            print(event)
+            print('-' * 80)
 
-thread: RunnableConfig = {'configurable': {'thread_id': '1'}}
+    final_state = graph.get_state(thread).values
+    print(f"\nStopped: {final_state['stop_reason']} ({final_state['usage']})")
+    print(f"Searches saved by skipping near-duplicate queries: {final_state['query_log']['saved']}")
+    print(f"Model tiers: {router.stats()}")
+    print(f"Blob store: {blobs.stats()}")
+    print("\nFinal Essay:")
+    print(blobs.get(final_state['output']))
 
-inputs: WriterState = {
-    'topic': 'The impact of renewable energy on climate change',
-    'total_iterations': 2,
-    'iteration': 1,
-    'sources': [],
-    'outline': '',
-    'output': '',
-    'feedback': ''
-}
+    export_from_env('reflexion')
 
-events = graph.stream(inputs, thread)
-for event in events:
-    print(event)
-    print('-' * 80)
 
-final_state = graph.get_state(thread).values
-print("\nFinal Essay:")
-print(final_state['output'])
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Load test for the chat server against a fake local LLM.
+
+Starts 02-building-with-langgraph/server.py in-process with FakeChatModel
+and a throwaway checkpoint file, then drives it over real sockets at
+increasing concurrency. For each level it reports p50/p99 time-to-first-token
+and full-turn latency, throughput and rejected requests.
+
+    python benchmarks/chat_load.py --levels 1 8 32 128 --requests 256
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-offline-benchmark")
+
+from benchmarks.fakes import FakeChatModel
+from common.checkpoint import DeltaSqliteSaver
+from common.examples import EXAMPLES, load_example
+
+
+def load_server():
+    spec = importlib.util.spec_from_file_location("chat_server", ROOT / EXAMPLES["langgraph"] / "server.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def percentile(samples, q):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+async def one_turn(port, thread_id, message):
+    """POST one chat turn and read its SSE stream; returns (status, ttft, total)."""
+    started = time.perf_counter()
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps({"thread_id": thread_id, "message": message}).encode("utf-8")
+    writer.write(
+        b"POST /chat HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+        + f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+    )
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    first_token = None
+    while line := await reader.readline():
+        if line.startswith(b"event: token") and first_token is None:
+            first_token = time.perf_counter() - started
+        elif line.startswith(b"event: done"):
+            break
+    writer.close()
+    await writer.wait_closed()
+    return status, first_token, time.perf_counter() - started
+
+
+async def run_level(port, concurrency, requests, threads):
+    results = []
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(i)
+
+    async def client():
+        while not queue.empty():
+            i = queue.get_nowait()
+            results.append(await one_turn(port, f"load-{i % threads}", f"Question {i}"))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+
+    ok = [r for r in results if r[0] == 200]
+    ttft = [r[1] for r in ok if r[1] is not None]
+    total = [r[2] for r in ok]
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "ok": len(ok),
+        "rejected": len(results) - len(ok),
+        "throughput_turns_per_s": len(ok) / wall,
+        "ttft_p50": percentile(ttft, 0.50),
+        "ttft_p99": percentile(ttft, 0.99),
+        "latency_p50": percentile(total, 0.50),
+        "latency_p99": percentile(total, 0.99),
+        "latency_mean": statistics.fmean(total) if total else None,
+    }
+
+
+async def run(args, workdir):
+    chatbot = load_example("langgraph")
+    chatbot.llm = FakeChatModel(
+        latency=args.llm_latency, per_token_latency=args.token_latency, output_tokens=args.output_tokens
+    )
+    chatbot.chatbot_graph_with_memory.checkpointer = DeltaSqliteSaver(workdir / "chat-load.sqlite")
+
+    server_module = load_server()
+    server = server_module.ChatServer(
+        chatbot.chatbot_graph_with_memory, max_active=args.max_active, max_waiting=args.max_waiting
+    )
+    listener = await server.start(port=0)
+    port = listener.sockets[0].getsockname()[1]
+
+    levels = []
+    async with listener:
+        for concurrency in args.levels:
+            levels.append(await run_level(port, concurrency, args.requests, args.threads))
+            print(f"[load] c={concurrency}: p50 {levels[-1]['latency_p50']:.3f}s "
+                  f"p99 {levels[-1]['latency_p99']:.3f}s", file=sys.stderr)
+    return levels
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 8, 32, 128], help="concurrent clients per level")
+    parser.add_argument("--requests", type=int, default=256, help="chat turns per level")
+    parser.add_argument("--threads", type=int, default=64, help="distinct thread_ids the turns are spread over")
+    parser.add_argument("--max-active", type=int, default=64)
+    parser.add_argument("--max-waiting", type=int, default=256)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds before the first fake token")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="seconds per streamed token")
+    parser.add_argument("--output-tokens", type=int, default=64)
+    parser.add_argument("--output", type=Path, help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        levels = asyncio.run(run(args, Path(tmp)))
+
+    report = {"settings": {k: v for k, v in vars(args).items() if k != "output"}, "levels": levels}
+    text = json.dumps(report, indent=2, default=str)
+    if args.output:
+        args.output.write_text(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Compare two cassettes (see common/cassette.py) node by node: LLM and search
+calls, tokens, time spent waiting on those calls, and node wall time.
+
+    python main.py reflexion --record runs/before.cassette
+    # ...change the graph code...
+    python main.py reflexion --replay runs/before.cassette --record runs/after.cassette
+    python benchmarks/compare_cassettes.py runs/before.cassette runs/after.cassette --max-regression 0.1
+
+With --max-regression the exit status is 1 when total calls, tokens or node
+time grew by more than that fraction, so the comparison can gate a change.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from common.cassette import Cassette
+
+METRICS = [
+    "llm_calls", "search_calls", "prompt_tokens", "completion_tokens",
+    "llm_seconds", "search_seconds", "node_runs", "node_seconds",
+]
+
+# Totals checked by --max-regression
+GATED = ["llm_calls", "search_calls", "prompt_tokens", "completion_tokens", "node_seconds"]
+
+
+def totals(summary):
+    return {metric: sum(row.get(metric, 0) for row in summary.values()) for metric in METRICS}
+
+
+def compare(before, after):
+    """{node: {metric: (before, after)}} for every node and metric seen in either run, plus "TOTAL"."""
+    a, b = before.summary(), after.summary()
+    rows = {}
+    for node in sorted(set(a) | set(b)):
+        rows[node] = {m: (a.get(node, {}).get(m, 0), b.get(node, {}).get(m, 0)) for m in METRICS}
+    ta, tb = totals(a), totals(b)
+    rows["TOTAL"] = {m: (ta[m], tb[m]) for m in METRICS}
+    return rows
+
+
+def change(old, new):
+    if old == new:
+        return 0.0
+    return (new - old) / old if old else float("inf")
+
+
+def format_value(metric, value):
+    return f"{value:.3f}s" if metric.endswith("seconds") else f"{value:g}"
+
+
+def report(rows):
+    lines = [f"{'node':<20}{'metric':<20}{'before':>12}{'after':>12}{'change':>10}"]
+    for node, metrics in rows.items():
+        for metric, (old, new) in metrics.items():
+            if not old and not new:
+                continue
+            lines.append(
+                f"{node:<20}{metric:<20}{format_value(metric, old):>12}{format_value(metric, new):>12}"
+                f"{change(old, new):>+10.1%}"
+            )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("before", type=Path)
+    parser.add_argument("after", type=Path)
+    parser.add_argument("--json", action="store_true", help="print the comparison as JSON")
+    parser.add_argument("--max-regression", type=float, help="fail if a gated total grows by more than this fraction")
+    args = parser.parse_args(argv)
+
+    rows = compare(Cassette.load(args.before), Cassette.load(args.after))
+    if args.json:
+        print(json.dumps({node: {m: {"before": o, "after": n} for m, (o, n) in ms.items()} for node, ms in rows.items()}, indent=2))
+    else:
+        print(report(rows))
+
+    if args.max_regression is not None:
+        regressed = [m for m in GATED if change(*rows["TOTAL"][m]) > args.max_regression]
+        if regressed:
+            print(f"Regressed beyond {args.max_regression:.0%}: {', '.join(regressed)}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""Local stand-ins for the OpenAI and Tavily clients, with configurable latency and sizes."""
+import asyncio
+import hashlib
+import itertools
+import json
+import re
+import time
+from types import SimpleNamespace
+from typing import get_origin
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+from pydantic import PrivateAttr
+
+from common.tokens import estimate_tokens
+
+WORDS = (
+    "energy grid solar wind storage policy emissions carbon cost demand supply "
+    "research data model latency cache api service deploy impact growth team"
+).split()
+
+
+def fake_text(n_tokens, seed=0):
+    """Deterministic filler text of roughly `n_tokens` tokens."""
+    return " ".join(WORDS[(seed + i) % len(WORDS)] for i in range(max(1, n_tokens)))
+
+
+def _prompt_tokens(messages):
+    return sum(estimate_tokens(str(getattr(m, "content", m))) for m in messages)
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model that sleeps instead of calling an API and returns filler text."""
+
+    latency: float = 0.05
+    per_token_latency: float = 0.0
+    output_tokens: int = 64
+    _calls: itertools.count = PrivateAttr(default_factory=itertools.count)
+
+    @property
+    def _llm_type(self):
+        return "fake-chat"
+
+    def _usage(self, messages):
+        prompt = _prompt_tokens(messages)
+        return {"input_tokens": prompt, "output_tokens": self.output_tokens, "total_tokens": prompt + self.output_tokens}
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency + self.per_token_latency * self.output_tokens)
+        message = AIMessage(
+            content=fake_text(self.output_tokens, next(self._calls)),
+            usage_metadata=self._usage(messages),
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency + self.per_token_latency * self.output_tokens)
+        message = AIMessage(
+            content=fake_text(self.output_tokens, next(self._calls)),
+            usage_metadata=self._usage(messages),
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _chunks(self, messages):
+        words = fake_text(self.output_tokens, next(self._calls)).split()
+        for i, word in enumerate(words):
+            last = i == len(words) - 1
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content=word + ("" if last else " "),
+                usage_metadata=self._usage(messages) if last else None,
+            ))
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        for chunk in self._chunks(messages):
+            time.sleep(self.per_token_latency)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        for chunk in self._chunks(messages):
+            await asyncio.sleep(self.per_token_latency)
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    def with_structured_output(self, schema, **kwargs):
+        def respond(messages):
+            time.sleep(self.latency)
+            call = next(self._calls)
+            values = {}
+            for name, field in schema.model_fields.items():
+                if get_origin(field.annotation) is list:
+                    values[name] = [f"{fake_text(6, call * 3 + i)} {call}-{i}" for i in range(3)]
+                elif field.annotation is str:
+                    values[name] = fake_text(self.output_tokens, call)
+                else:
+                    values[name] = field.default
+            return schema(**values)
+
+        return RunnableLambda(respond, name=f"fake_structured_{schema.__name__}")
+
+
+class FakeSearchClient:
+    """Tavily-shaped search client returning deterministic results after a delay."""
+
+    def __init__(self, latency=0.05, content_tokens=200):
+        self.latency = latency
+        self.content_tokens = content_tokens
+        self.calls = 0
+
+    def search(self, query, max_results=5, **params):
+        time.sleep(self.latency)
+        self.calls += 1
+        seed = int(hashlib.sha1(query.encode("utf-8")).hexdigest()[:8], 16)
+        return {
+            "query": query,
+            "results": [
+                {
+                    "title": f"Result {i} for {query}",
+                    "url": f"https://example.com/{seed % 10_000}/{i}",
+                    "content": fake_text(self.content_tokens, seed + i),
+                }
+                for i in range(max_results)
+            ],
+        }
+
+
+class FakeOpenAI:
+    """
+    Minimal OpenAI client for the ReAct agent: asks for tools on a fresh
+    question and answers once it has seen an observation.
+    Like a real model without stop sequences, it keeps going after STOP with
+    made-up observations, so `stop=`, streaming cut-offs and native tool
+    calls (`tools=`) each change how many tokens a step produces.
+    """
+
+    def __init__(self, latency=0.05, output_tokens=64, token_latency=0.0):
+        self.latency = latency
+        self.output_tokens = output_tokens
+        self.token_latency = token_latency
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def reply(self, messages, tools):
+        last = messages[-1]
+        if last["role"] == "tool" or (last["content"] or "").startswith("Observation:"):
+            return "Answer: " + fake_text(self.output_tokens, len(messages)), None
+        if tools:
+            calls = [("check_weather", {"city": "Tokyo"}), ("search_hotels", {"city_and_budget": "Tokyo, mid"})]
+            return None, [
+                SimpleNamespace(id=f"call_{i}", type="function",
+                                function=SimpleNamespace(name=name, arguments=json.dumps(arguments)))
+                for i, (name, arguments) in enumerate(calls)
+            ]
+        return (
+            "Thought: I need the weather and hotel options.\n"
+            "Action: check_weather: Tokyo\n"
+            "Action: search_hotels: Tokyo, mid\n"
+            "STOP\n"
+            "Observation: Tokyo: Sunny, 25°C\n"
+            "Thought: " + fake_text(self.output_tokens, len(messages))
+        ), None
+
+    def create(self, model, messages, stop=None, stream=False, tools=None, stream_options=None, **params):
+        time.sleep(self.latency)
+        content, tool_calls = self.reply(messages, tools)
+        for sequence in stop or []:
+            if content and sequence in content:
+                content = content[:content.index(sequence)]
+        prompt_tokens = sum(estimate_tokens(m["content"] or "") for m in messages)
+        completion_tokens = estimate_tokens(content or "") + 10 * len(tool_calls or [])
+        usage = SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens,
+        )
+        if stream:
+            return self._stream(content or "", usage if (stream_options or {}).get("include_usage") else None)
+
+        time.sleep(self.token_latency * completion_tokens)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(
+                message=SimpleNamespace(content=content, tool_calls=tool_calls),
+                finish_reason="tool_calls" if tool_calls else "stop",
+            )],
+            usage=usage,
+        )
+
+    def _stream(self, content, usage=None):
+        for piece in re.findall(r"\S+\s*|\s+", content):
+            time.sleep(self.token_latency)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))], usage=None)
+        if usage is not None:
+            # Like the API with include_usage: a last chunk with no choices, only the usage
+            yield SimpleNamespace(choices=[], usage=usage)
\ No newline at end of file
@@ -0,0 +1,268 @@
+"""
+Offline benchmark for the four examples.
+
+Every OpenAI/Tavily client is swapped for a local fake with configurable
+latency and output size, so the numbers reflect graph overhead and
+concurrency behaviour rather than network conditions.
+
+    python benchmarks/run.py --runs 8 --concurrency 4 --output bench.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+# Clients are built lazily, but make sure any that do get built never need real keys
+os.environ.setdefault("OPENAI_API_KEY", "sk-offline-benchmark")
+os.environ.setdefault("TAVILY_API_KEY", "tvly-offline-benchmark")
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import HumanMessage
+
+from benchmarks.fakes import FakeChatModel, FakeOpenAI, FakeSearchClient
+from common.blobs import BlobStore
+from common.checkpoint import DeltaSqliteSaver
+from common.convergence import ConvergenceDetector
+from common.examples import EXAMPLES, load_example
+from common.llm_cache import ResponseCache
+from common.search import SearchExecutor
+
+
+class NodeTimer(BaseCallbackHandler):
+    """Collects wall time per graph node (or per timed call for the plain agent)."""
+
+    def __init__(self):
+        self.durations = defaultdict(list)
+        self._starts = {}
+        self._lock = threading.Lock()
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        # A node's own runnable may carry the node's name too; only the outer run is timed
+        if node and kwargs.get("name") == node and parent_run_id not in self._starts:
+            self._starts[run_id] = (node, time.perf_counter())
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        if started := self._starts.pop(run_id, None):
+            self.record(started[0], time.perf_counter() - started[1])
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._starts.pop(run_id, None)
+
+    def record(self, name, seconds):
+        with self._lock:
+            self.durations[name].append(seconds)
+
+    def time(self, name, fn, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        "count": len(samples),
+        "mean": statistics.fmean(samples),
+        "p50": samples[len(samples) // 2],
+        "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "total": sum(samples),
+    }
+
+
+def file_size(path):
+    return sum(p.stat().st_size for p in (path, Path(f"{path}-wal")) if p.exists())
+
+
+def setup_react(args, workdir):
+    module = load_example("react")
+    module.client = FakeOpenAI(
+        latency=args.llm_latency, output_tokens=args.output_tokens, token_latency=args.token_latency
+    )
+    # max_entries=0 turns the response cache into a pass-through
+    module.response_cache = ResponseCache(path=workdir / "react-llm.sqlite", max_entries=0)
+
+    def run(i, timer):
+        agent = module.make_agent(args.react_mode, tools=module.available_tools)
+        execute = agent.execute
+        agent.execute = lambda *a, **kw: timer.time("execute", execute, *a, **kw)
+        tools = {
+            name: (lambda fn, name: lambda tool_input: timer.time(f"tool:{name}", fn, tool_input))(fn, name)
+            for name, fn in module.available_tools.items()
+        }
+        module.run_agent_loop(f"Trip question {i}: what to pack for Tokyo and where to stay?", agent, tools)
+
+    return run, None
+
+
+def setup_langgraph(args, workdir):
+    module = load_example("langgraph")
+    module.llm = FakeChatModel(
+        latency=args.llm_latency, per_token_latency=args.token_latency, output_tokens=args.output_tokens
+    )
+    graph = module.chatbot_graph_with_memory
+    graph.checkpointer = DeltaSqliteSaver(workdir / "langgraph-checkpoints.sqlite")
+
+    def run(i, timer):
+        config = {"configurable": {"thread_id": f"bench-{i}"}, "callbacks": [timer]}
+        for turn in range(args.turns):
+            graph.invoke({"messages": [HumanMessage(content=f"Question {turn} from user {i}")]}, config)
+
+    return run, graph.checkpointer
+
+
+def setup_reflection(args, workdir):
+    module = load_example("reflection")
+    fake = FakeChatModel(latency=args.llm_latency, output_tokens=args.output_tokens)
+    module.generate_chain = module.generation_prompt | fake
+    module.critique_chain = module.critique_prompt | fake
+    if not args.converge:
+        module.convergence = ConvergenceDetector([])
+
+    def run(i, timer):
+        inputs = {"messages": [HumanMessage(content=f"Write a LinkedIn post about project {i}")]}
+        module.graph.invoke(inputs, {"callbacks": [timer]})
+
+    return run, None
+
+
+def setup_reflexion(args, workdir):
+    module = load_example("reflexion")
+    module.model = FakeChatModel(latency=args.llm_latency, output_tokens=args.output_tokens)
+    for tier in module.router.tiers.values():
+        tier.model = module.model
+    module.tavily = FakeSearchClient(latency=args.search_latency, content_tokens=args.source_tokens)
+    module.search = SearchExecutor(module.tavily, max_workers=module.SEARCH_CONCURRENCY)
+    module.blobs = BlobStore(workdir / "reflexion-blobs.sqlite")
+    module.graph.checkpointer = DeltaSqliteSaver(workdir / "reflexion-checkpoints.sqlite", blobs=module.blobs)
+    if not args.converge:
+        module.convergence = ConvergenceDetector([])
+
+    def run(i, timer):
+        inputs = {
+            'topic': f'Benchmark topic {i}: renewable energy and climate change',
+            'total_iterations': args.iterations,
+            'iteration': 1,
+            'sources': None,
+            'outline': '',
+            'output': '',
+            'feedback': '',
+            'usage': None,
+            'stop_reason': '',
+            'query_log': None,
+        }
+        config = {"configurable": {"thread_id": f"bench-{i}"}, "callbacks": [timer]}
+        module.graph.invoke(inputs, config)
+
+    return run, module.graph.checkpointer
+
+
+SETUPS = {
+    "react": setup_react,
+    "langgraph": setup_langgraph,
+    "reflection": setup_reflection,
+    "reflexion": setup_reflexion,
+}
+
+
+def bench(name, args, workdir):
+    run, checkpointer = SETUPS[name](args, workdir)
+    timer = NodeTimer()
+    run_times = []
+
+    def timed_run(i):
+        started = time.perf_counter()
+        run(i, timer)
+        run_times.append(time.perf_counter() - started)
+
+    tracemalloc.reset_peak()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(timed_run, range(args.runs)))
+    wall = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+
+    return {
+        "runs": args.runs,
+        "concurrency": args.concurrency,
+        "wall_time": wall,
+        "throughput_runs_per_s": args.runs / wall,
+        "run_latency": summarize(run_times),
+        "nodes": {node: summarize(samples) for node, samples in sorted(timer.durations.items())},
+        "peak_memory_bytes": peak,
+        "checkpoint_bytes": file_size(checkpointer.path) if checkpointer is not None else None,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--examples", nargs="+", choices=list(EXAMPLES), default=list(EXAMPLES))
+    parser.add_argument("--runs", type=int, default=8, help="end-to-end runs per example")
+    parser.add_argument("--concurrency", type=int, default=4, help="runs in flight at once")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per fake LLM call")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="seconds per streamed token")
+    parser.add_argument("--search-latency", type=float, default=0.05, help="seconds per fake search")
+    parser.add_argument("--output-tokens", type=int, default=64, help="tokens per fake completion")
+    parser.add_argument("--source-tokens", type=int, default=200, help="tokens per fake search result")
+    parser.add_argument("--turns", type=int, default=3, help="chat turns per run (langgraph)")
+    parser.add_argument("--iterations", type=int, default=2, help="revision rounds (reflexion)")
+    parser.add_argument("--react-mode", choices=["text", "stop", "stream", "tools"], default="text",
+                        help="agent execution mode (react)")
+    parser.add_argument(
+        "--converge", action="store_true",
+        help="let convergence checks end loops early (off keeps round counts fixed across commits)",
+    )
+    parser.add_argument("--output", type=Path, help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "settings": {k: v for k, v in vars(args).items() if k not in ("examples", "output")},
+        "results": {},
+    }
+
+    tracemalloc.start()
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.examples:
+            report["results"][name] = bench(name, args, Path(tmp))
+            print(f"[bench] {name}: {report['results'][name]['wall_time']:.2f}s", file=sys.stderr)
+    tracemalloc.stop()
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from common.sources import normalized
+
+# Refs are plain strings, so they pass through any checkpoint serializer unchanged
+REF_PREFIX = "blob:"
+
+
+def is_ref(value):
+    return isinstance(value, str) and value.startswith(REF_PREFIX)
+
+
+def blob_ref(text):
+    """Ref of `text`: the SHA-256 of its case- and whitespace-normalized form, as in content_hash."""
+    return REF_PREFIX + hashlib.sha256(normalized(text).encode("utf-8")).hexdigest()
+
+
+def find_refs(value, refs):
+    """Add every ref found in `value` (nested lists, tuples, sets and dict values) to `refs`."""
+    if is_ref(value):
+        refs.add(value)
+    elif isinstance(value, dict):
+        for item in value.values():
+            find_refs(item, refs)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        for item in value:
+            find_refs(item, refs)
+    return refs
+
+
+class BlobStore:
+    """
+    Content-addressed SQLite store for large text held in graph state.
+
+    `put` saves a text under the hash of its normalized content and returns a
+    short ref to keep in the state instead, so checkpoints stay small and the
+    same text is stored once however many steps, threads or runs produce it.
+    Texts differing only in case or whitespace share a ref (and the first one
+    stored), just as add_sources treats them as duplicates. `get` loads the text
+    back when a node actually reads it; anything that isn't a ref (such as text
+    passed in with the inputs) is returned as is. Recently used texts are kept
+    in an LRU of `cache_size` entries.
+
+    `collect` deletes the blobs no checkpoint refers to any more; a
+    DeltaSqliteSaver given this store calls it after compaction and thread
+    deletion.
+    """
+
+    def __init__(self, path, cache_size=1024):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.cache_size = cache_size
+        self.writes = 0
+        self.deduplicated = 0
+        self.collected = 0
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS blobs (ref TEXT PRIMARY KEY, text TEXT NOT NULL, touched REAL NOT NULL)"
+        )
+        if "touched" not in {row[1] for row in self._db.execute("PRAGMA table_info(blobs)")}:
+            # Stores from before `collect` existed; their blobs become collectable once unreferenced
+            self._db.execute("ALTER TABLE blobs ADD COLUMN touched REAL NOT NULL DEFAULT 0")
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.commit()
+
+    def _cache(self, ref, text):
+        self._values[ref] = text
+        self._values.move_to_end(ref)
+        while len(self._values) > self.cache_size:
+            self._values.popitem(last=False)
+
+    def put(self, text):
+        """Store `text` (once per distinct content) and return its ref."""
+        return self.put_many([text])[0]
+
+    def put_many(self, texts):
+        refs = [blob_ref(text) for text in texts]
+        now = time.time()
+        with self._lock:
+            for ref, text in zip(refs, texts):
+                # A repeat only refreshes `touched`, so `collect` can't delete a blob that was just stored
+                # again; the text stored first (possibly another variant) is the one `get` returns
+                if self._db.execute("UPDATE blobs SET touched = ? WHERE ref = ?", (now, ref)).rowcount:
+                    self.deduplicated += 1
+                else:
+                    self._db.execute("INSERT INTO blobs VALUES (?, ?, ?)", (ref, text, now))
+                    self.writes += 1
+                    self._cache(ref, text)
+            self._db.commit()
+        return refs
+
+    def get(self, ref):
+        """The text behind `ref`; '' for an empty field."""
+        return self.get_many([ref])[0] if ref else ""
+
+    def get_many(self, refs):
+        with self._lock:
+            missing = [ref for ref in refs if is_ref(ref) and ref not in self._values]
+            for start in range(0, len(missing), 500):
+                chunk = missing[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT ref, text FROM blobs WHERE ref IN ({', '.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                for ref, text in rows:
+                    self._cache(ref, text)
+            texts = []
+            for ref in refs:
+                if not is_ref(ref):
+                    texts.append(ref)
+                elif ref in self._values:
+                    self._values.move_to_end(ref)
+                    texts.append(self._values[ref])
+                else:
+                    raise KeyError(ref)
+        return texts
+
+    def collect(self, live, grace=600.0):
+        """
+        Delete every blob not in the `live` refs, except those stored in the last
+        `grace` seconds: a node may have stored them without its update being
+        checkpointed yet. Returns the number of blobs deleted.
+        """
+        cutoff = time.time() - grace
+        with self._lock:
+            stored = self._db.execute("SELECT ref FROM blobs WHERE touched < ?", (cutoff,)).fetchall()
+            dead = [(ref,) for (ref,) in stored if ref not in live]
+            self._db.executemany("DELETE FROM blobs WHERE ref = ?", dead)
+            self._db.commit()
+            for (ref,) in dead:
+                self._values.pop(ref, None)
+            self.collected += len(dead)
+        return len(dead)
+
+    def stats(self):
+        with self._lock:
+            blobs, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(CAST(text AS BLOB))), 0) FROM blobs"
+            ).fetchone()
+        return {
+            "blobs": blobs, "bytes": size,
+            "writes": self.writes, "deduplicated": self.deduplicated, "collected": self.collected,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,101 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+CACHE_DIR = Path(__file__).resolve().parent.parent / ".cache"
+
+
+def cache_key(*parts):
+    """Stable hash of JSON-serializable parts (dict keys are sorted)."""
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """
+    Small SQLite key/value cache with a TTL and size-bounded LRU eviction.
+    Values are stored as JSON. Safe to share between threads.
+
+    A hit doesn't write to the database: its new `last_used` time is held in
+    memory and written with the next `set` (before eviction picks its
+    victims) or once `flush_every` hits have piled up.
+    """
+
+    def __init__(self, path, ttl=None, max_entries=10_000, flush_every=256):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.flush_every = flush_every
+        self.hits = 0
+        self.misses = 0
+        # key -> last_used time of a hit not yet written
+        self._touched = {}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS cache_last_used ON cache (last_used)")
+        self._db.commit()
+
+    def get(self, key):
+        """Return the cached value, or None on a miss or an expired entry."""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT value, created FROM cache WHERE key = ?", (key,)).fetchone()
+            if row and self.ttl is not None and now - row[1] > self.ttl:
+                self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._db.commit()
+                self._touched.pop(key, None)
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._touched[key] = now
+            if len(self._touched) >= self.flush_every:
+                self._flush()
+                self._db.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def _flush(self):
+        """Write the pending hit times; the caller holds the lock and commits."""
+        if self._touched:
+            self._db.executemany(
+                "UPDATE cache SET last_used = ? WHERE key = ?", [(t, k) for k, t in self._touched.items()]
+            )
+            self._touched.clear()
+
+    def set(self, key, value):
+        """Store a value and evict the least recently used entries beyond `max_entries`."""
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache (key, value, created, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            )
+            self._touched.pop(key, None)
+            self._flush()
+            self._db.execute(
+                "DELETE FROM cache WHERE key IN ("
+                "SELECT key FROM cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM cache")
+            self._db.commit()
+            self._touched.clear()
+
+    def stats(self):
+        with self._lock:
+            size = self._db.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": size}
@@ -0,0 +1,495 @@
+"""
+Record/replay cassettes for the LLM and search calls the examples make.
+
+Every OpenAI request (raw SDK clients and LangChain models alike) goes
+through the pooled httpx clients in common.clients, and every Tavily search
+goes through a common.search.pooled_session. A cassette hooks in at that
+transport layer, so it sees each request and response exactly as they went
+over the wire, streamed or not, without touching the graph code.
+
+    python main.py reflexion --record runs/before.cassette
+    python main.py reflexion --replay runs/before.cassette --record runs/after.cassette --zero-latency
+    python benchmarks/compare_cassettes.py runs/before.cassette runs/after.cassette
+
+A cassette is gzipped JSON lines. The first line is a header, the last holds
+the per-node wall times from METRICS, and each line in between is one call:
+request, response body, the chunk timing of a streamed response, token counts
+and the graph node it was made from. In replay, a request is matched on its
+method, path and body. A request whose body has changed (say, an edited
+prompt) gets the next unused recording for the same endpoint and node, and
+only when there is none does the call fail with CassetteMiss. Replay serves
+each response with its recorded timing, or instantly with zero_latency.
+While a cassette is active the response and search caches are bypassed.
+"""
+import asyncio
+import atexit
+import gzip
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from common.cache import cache_key
+from common.clients import sdk_httpx
+from common.metrics import current_node
+from common.tokens import estimate_tokens
+
+VERSION = 1
+
+httpx = sdk_httpx()
+
+
+class CassetteMiss(LookupError):
+    """Replay found no recorded response for a request."""
+
+
+def call_kind(url):
+    host, path = urlsplit(url)[1:3]
+    if path.endswith("/completions"):
+        return "llm"
+    if "tavily" in host:
+        return "search"
+    return "http"
+
+
+def canonical_body(body):
+    """Request body as text with JSON keys sorted, so equal requests match however they were serialized."""
+    text = body.decode("utf-8", "surrogateescape") if isinstance(body, bytes) else (body or "")
+    try:
+        return json.dumps(json.loads(text), sort_keys=True, separators=(",", ":"))
+    except ValueError:
+        return text
+
+
+def request_key(method, url, body):
+    return cache_key(method.upper(), urlsplit(url).path, canonical_body(body))
+
+
+def token_usage(request_body, response_body):
+    """
+    (prompt, completion) tokens of an OpenAI call, from the reported usage.
+    Streams without a usage chunk are estimated from the messages and deltas.
+    """
+    try:
+        request = json.loads(request_body or "{}")
+    except ValueError:
+        return 0, 0
+    if not isinstance(request, dict) or "messages" not in request:
+        return 0, 0
+
+    try:
+        usage = json.loads(response_body).get("usage")
+        if usage:
+            return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+        return 0, 0
+    except ValueError:
+        pass
+
+    # Server-sent events: usage arrives in a last chunk only if it was asked for
+    usage, completion = None, []
+    for line in response_body.splitlines():
+        if not line.startswith("data: ") or line == "data: [DONE]":
+            continue
+        try:
+            chunk = json.loads(line[6:])
+        except ValueError:
+            continue
+        usage = chunk.get("usage") or usage
+        for choice in chunk.get("choices") or []:
+            delta = choice.get("delta") or {}
+            completion.append(delta.get("content") or "")
+            completion.extend((call.get("function") or {}).get("arguments") or "" for call in delta.get("tool_calls") or [])
+    if usage:
+        return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+    prompt = sum(estimate_tokens(str(m.get("content") or "")) for m in request["messages"])
+    return prompt, estimate_tokens("".join(completion))
+
+
+class Cassette:
+    """The calls of one run, plus its per-node wall times."""
+
+    def __init__(self, calls=None, nodes=None, header=None):
+        self.calls = calls or []
+        self.nodes = nodes or {}
+        self.header = header or {"version": VERSION, "created": time.time()}
+        self._lock = threading.Lock()
+
+    def add(self, call):
+        with self._lock:
+            self.calls.append(call)
+
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            calls = sorted(self.calls, key=lambda call: call["started"])
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            f.write(json.dumps(self.header) + "\n")
+            for call in calls:
+                f.write(json.dumps(call, separators=(",", ":")) + "\n")
+            f.write(json.dumps({"nodes": self.nodes}) + "\n")
+
+    @classmethod
+    def load(cls, path):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f if line.strip()]
+        if not lines or lines[0].get("version") != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} cassette")
+        nodes = lines[-1]["nodes"] if "nodes" in lines[-1] else {}
+        calls = [line for line in lines[1:] if "nodes" not in line]
+        return cls(calls, nodes, lines[0])
+
+    def summary(self):
+        """Per node: LLM/search calls, tokens, time spent in calls, and the node's own wall time."""
+        rows = defaultdict(lambda: defaultdict(float))
+        for call in self.calls:
+            row = rows[call.get("node") or "-"]
+            row[f"{call['kind']}_calls"] += 1
+            row[f"{call['kind']}_seconds"] += call["seconds"]
+            row["prompt_tokens"] += call.get("prompt_tokens", 0)
+            row["completion_tokens"] += call.get("completion_tokens", 0)
+        for node, stats in self.nodes.items():
+            rows[node]["node_runs"] += stats["count"]
+            rows[node]["node_seconds"] += stats["seconds"]
+        return {node: dict(row) for node, row in rows.items()}
+
+
+class Player:
+    """Serves a cassette's responses back, matched by request key."""
+
+    def __init__(self, cassette, zero_latency=False):
+        self.zero_latency = zero_latency
+        self._by_key = defaultdict(deque)
+        self._by_slot = defaultdict(deque)
+        self._used = set()
+        self._lock = threading.Lock()
+        for i, call in enumerate(cassette.calls):
+            self._by_key[call["key"]].append(i)
+            self._by_slot[(call["endpoint"], call.get("node"))].append(i)
+        self.calls = cassette.calls
+        self.hits = 0
+        self.fallbacks = 0
+
+    def _take(self, queue):
+        while queue:
+            i = queue.popleft()
+            if i not in self._used:
+                self._used.add(i)
+                return self.calls[i]
+        return None
+
+    def match(self, method, url, body):
+        key = request_key(method, url, body)
+        endpoint = endpoint_of(url)
+        with self._lock:
+            call = self._take(self._by_key[key])
+            if call is not None:
+                self.hits += 1
+                return call
+            call = self._take(self._by_slot[(endpoint, current_node())])
+            if call is not None:
+                self.fallbacks += 1
+                return call
+        raise CassetteMiss(f"no recorded {method} {endpoint} call left for node {current_node() or '-'}")
+
+    def wait(self, seconds):
+        if not self.zero_latency and seconds > 0:
+            time.sleep(seconds)
+
+    def chunks(self, call):
+        """(offset seconds, bytes) pieces of the recorded response body."""
+        body = call["body"].encode("utf-8", "surrogateescape")
+        pieces, start = [], 0
+        for offset, size in call.get("chunks") or [[call["seconds"], len(body)]]:
+            pieces.append((0.0 if self.zero_latency else offset, body[start:start + size]))
+            start += size
+        if start < len(body):
+            pieces.append((pieces[-1][0] if pieces else 0.0, body[start:]))
+        return pieces
+
+
+def endpoint_of(url):
+    host, path = urlsplit(url)[1:3]
+    return f"{host}{path}"
+
+
+class Recorder:
+    """Collects calls into a cassette and saves it when the process exits."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.cassette = Cassette()
+
+    def record(self, method, url, request_body, status, content_type, body, started, ttfb, chunks, node):
+        request_text = request_body.decode("utf-8", "surrogateescape") if isinstance(request_body, bytes) else (request_body or "")
+        body_text = body.decode("utf-8", "surrogateescape")
+        prompt_tokens, completion_tokens = token_usage(request_text, body_text)
+        self.cassette.add({
+            "key": request_key(method, url, request_text),
+            "method": method,
+            "endpoint": endpoint_of(url),
+            "kind": call_kind(url),
+            "node": node,
+            "started": started,
+            "request": request_text,
+            "status": status,
+            "content_type": content_type,
+            "body": body_text,
+            "ttfb": ttfb,
+            "seconds": chunks[-1][0] if chunks else ttfb,
+            # [offset, byte length] per streamed chunk; a plain response is a single chunk
+            "chunks": [[offset, len(data)] for offset, data in chunks] if len(chunks) > 1 else None,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+        })
+
+    def save(self):
+        from common.metrics import METRICS
+        nodes = defaultdict(dict)
+        for (name, labels), value in METRICS.totals().items():
+            if name in ("node_seconds_sum", "node_seconds_count"):
+                nodes[dict(labels)["node"]]["seconds" if name.endswith("_sum") else "count"] = value
+        self.cassette.nodes = dict(nodes)
+        self.cassette.save(self.path)
+
+
+# --- httpx (OpenAI) ------------------------------------------------------------
+
+
+class _RecordingStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+    """Passes a response body through while noting when each chunk arrived."""
+
+    def __init__(self, stream, started, finish):
+        self.stream = stream
+        self.started = started
+        self.finish = finish
+        self.chunks = []
+        self.closed = False
+
+    def _note(self, chunk):
+        self.chunks.append((time.perf_counter() - self.started, chunk))
+
+    def _done(self):
+        if not self.closed:
+            self.closed = True
+            self.finish(self.chunks)
+
+    def __iter__(self):
+        for chunk in self.stream:
+            self._note(chunk)
+            yield chunk
+
+    def close(self):
+        try:
+            self.stream.close()
+        finally:
+            self._done()
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            self._note(chunk)
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self.stream.aclose()
+        finally:
+            self._done()
+
+
+class _ReplayStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+    def __init__(self, pieces, started, zero_latency):
+        self.pieces = pieces
+        self.started = started
+        self.zero_latency = zero_latency
+
+    def _delay(self, offset):
+        return 0.0 if self.zero_latency else offset - (time.perf_counter() - self.started)
+
+    def __iter__(self):
+        for offset, data in self.pieces:
+            if (delay := self._delay(offset)) > 0:
+                time.sleep(delay)
+            yield data
+
+    def close(self):
+        pass
+
+    async def __aiter__(self):
+        for offset, data in self.pieces:
+            if (delay := self._delay(offset)) > 0:
+                await asyncio.sleep(delay)
+            yield data
+
+    async def aclose(self):
+        pass
+
+
+class CassetteTransport(httpx.BaseTransport):
+    """httpx transport that records and/or replays through the active cassettes."""
+
+    def __init__(self, inner, recorder=None, player=None):
+        self.inner = inner
+        self.recorder = recorder
+        self.player = player
+
+    def _replayed(self, request, started):
+        call = self.player.match(request.method, str(request.url), request.content)
+        stream = _ReplayStream(self.player.chunks(call), started, self.player.zero_latency)
+        return call, httpx.Response(
+            call["status"], headers={"content-type": call["content_type"]}, stream=stream, request=request,
+        )
+
+    def _recording(self, request, response, started):
+        ttfb = time.perf_counter() - started
+        node = current_node()
+        wall = time.time()
+
+        def finish(chunks):
+            self.recorder.record(
+                request.method, str(request.url), request.content, response.status_code,
+                response.headers.get("content-type", ""), b"".join(data for _, data in chunks),
+                wall, ttfb, chunks, node,
+            )
+
+        return httpx.Response(
+            response.status_code, headers=response.headers,
+            stream=_RecordingStream(response.stream, started, finish),
+            request=request, extensions=response.extensions,
+        )
+
+    def _prepare(self, request):
+        # Uncompressed bodies, so the cassette holds readable text that replays as-is
+        request.headers["accept-encoding"] = "identity"
+
+    def handle_request(self, request):
+        started = time.perf_counter()
+        if self.player is not None:
+            call, response = self._replayed(request, started)
+            self.player.wait(call["ttfb"])
+        else:
+            self._prepare(request)
+            response = self.inner.handle_request(request)
+        return self._recording(request, response, started) if self.recorder else response
+
+    def close(self):
+        if self.inner is not None:
+            self.inner.close()
+
+
+class AsyncCassetteTransport(CassetteTransport, httpx.AsyncBaseTransport):
+    async def handle_async_request(self, request):
+        started = time.perf_counter()
+        if self.player is not None:
+            call, response = self._replayed(request, started)
+            if not self.player.zero_latency:
+                await asyncio.sleep(call["ttfb"])
+        else:
+            self._prepare(request)
+            response = await self.inner.handle_async_request(request)
+        return self._recording(request, response, started) if self.recorder else response
+
+    async def aclose(self):
+        if self.inner is not None:
+            await self.inner.aclose()
+
+
+# --- requests (Tavily) ----------------------------------------------------------
+
+
+def cassette_adapter(recorder, player, **adapter_params):
+    """requests adapter that records and/or replays through the active cassettes."""
+    from requests import Response
+    from requests.adapters import HTTPAdapter
+    from requests.structures import CaseInsensitiveDict
+
+    class CassetteAdapter(HTTPAdapter):
+        def send(self, request, **kwargs):
+            started = time.perf_counter()
+            if player is not None:
+                call = player.match(request.method, request.url, request.body)
+                player.wait(call["seconds"])
+                response = Response()
+                response.status_code = call["status"]
+                response.headers = CaseInsensitiveDict({"content-type": call["content_type"]})
+                response._content = call["body"].encode("utf-8", "surrogateescape")
+                response.encoding = "utf-8"
+                response.url = request.url
+                response.request = request
+                response.connection = self
+            else:
+                response = super().send(request, **kwargs)
+            if recorder is not None:
+                seconds = time.perf_counter() - started
+                recorder.record(
+                    request.method, request.url, request.body, response.status_code,
+                    response.headers.get("content-type", ""), response.content,
+                    time.time() - seconds, seconds, [(seconds, response.content)], current_node(),
+                )
+            return response
+
+    return CassetteAdapter(**adapter_params)
+
+
+# --- activation -----------------------------------------------------------------
+
+_state = {"configured": False, "recorder": None, "player": None}
+_state_lock = threading.Lock()
+
+
+def configure(record=None, replay=None, zero_latency=False):
+    """
+    Record this process's calls to `record` and/or serve them from the cassette
+    at `replay`. Call before the first API client is built. Without explicit
+    arguments the CASSETTE_RECORD, CASSETTE_REPLAY and CASSETTE_ZERO_LATENCY
+    environment variables are used.
+    """
+    with _state_lock:
+        _state["configured"] = True
+        if record:
+            _state["recorder"] = Recorder(record)
+            atexit.register(_state["recorder"].save)
+        if replay:
+            _state["player"] = Player(Cassette.load(replay), zero_latency=zero_latency)
+            # Clients insist on keys even though nothing leaves the process
+            os.environ.setdefault("OPENAI_API_KEY", "sk-cassette-replay")
+            os.environ.setdefault("TAVILY_API_KEY", "tvly-cassette-replay")
+
+
+def active():
+    """(recorder, player) for this process; either may be None."""
+    if not _state["configured"]:
+        configure(
+            record=os.getenv("CASSETTE_RECORD"),
+            replay=os.getenv("CASSETTE_REPLAY"),
+            zero_latency=os.getenv("CASSETTE_ZERO_LATENCY", "") not in ("", "0"),
+        )
+    return _state["recorder"], _state["player"]
+
+
+def in_use():
+    """
+    True while this process records or replays. The disk caches in front of the
+    API (common.llm_cache, common.search) step aside then, so a cassette sees
+    every call instead of only the cache misses.
+    """
+    recorder, player = active()
+    return recorder is not None or player is not None
+
+
+def cassette_transport(limits):
+    """httpx transport routed through the active cassettes, or None (httpx's default) if there are none."""
+    recorder, player = active()
+    if recorder is None and player is None:
+        return None
+    return CassetteTransport(None if player else httpx.HTTPTransport(limits=limits), recorder, player)
+
+
+def async_cassette_transport(limits):
+    recorder, player = active()
+    if recorder is None and player is None:
+        return None
+    return AsyncCassetteTransport(None if player else httpx.AsyncHTTPTransport(limits=limits), recorder, player)
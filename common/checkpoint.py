@@ -0,0 +1,464 @@
+import asyncio
+import random
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+from common.blobs import find_refs
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    parent_id TEXT,
+    type TEXT NOT NULL,
+    checkpoint BLOB NOT NULL,
+    metadata_type TEXT NOT NULL,
+    metadata BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    base_version TEXT,
+    depth INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT NOT NULL,
+    value BLOB NOT NULL,
+    task_path TEXT NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+"""
+
+
+class DeltaSqliteSaver(BaseCheckpointSaver[str]):
+    """
+    Durable SQLite checkpointer that stores list channels (like `messages`
+    or `sources`) as deltas.
+
+    A list value that extends the previously stored version of the same
+    channel is written as just the appended items plus a pointer to that
+    base version. Every `snapshot_every` deltas a full snapshot is written,
+    which keeps rebuild chains short. Decoded values are kept in a small LRU,
+    so `get_state` on an active thread rarely touches the delta chain at all.
+    The newest list per channel, which the next delta is diffed against, is
+    kept in an LRU of the same size and rebuilt from SQLite when it's missing.
+
+    `compact()` (or the background thread from `start_compaction`) drops all
+    but the newest `keep_last` checkpoints per thread and rewrites any delta
+    whose base was dropped as a full snapshot.
+
+    Given the BlobStore whose refs the graph keeps in its state as `blobs`,
+    compaction and `delete_thread` also collect the blobs no stored
+    checkpoint or pending write refers to any more.
+    """
+
+    def __init__(self, path, *, serde=None, snapshot_every=10, cache_size=256, blobs=None):
+        super().__init__(serde=serde)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.snapshot_every = snapshot_every
+        self.cache_size = cache_size
+        self.blobs = blobs
+        self.lock = threading.RLock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.commit()
+        # (thread_id, ns, channel) -> (version, value, depth) of the newest list blob
+        self._latest = OrderedDict()
+        self._values = OrderedDict()
+        self._compactor = None
+        self._stop = threading.Event()
+
+    # --- blob encoding -------------------------------------------------
+
+    def _cache(self, key, value):
+        self._values[key] = value
+        self._values.move_to_end(key)
+        while len(self._values) > self.cache_size:
+            self._values.popitem(last=False)
+
+    def _remember_latest(self, key, entry):
+        self._latest[key] = entry
+        self._latest.move_to_end(key)
+        while len(self._latest) > self.cache_size:
+            self._latest.popitem(last=False)
+
+    def _latest_list(self, thread_id, ns, channel):
+        """(version, value, depth) of the channel's newest stored list, from the LRU or SQLite."""
+        key = (thread_id, ns, channel)
+        if key in self._latest:
+            self._latest.move_to_end(key)
+            return self._latest[key]
+
+        row = self.db.execute(
+            "SELECT version, depth FROM blobs "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND kind != 'empty' "
+            "ORDER BY version DESC LIMIT 1",
+            key,
+        ).fetchone()
+        if row is None:
+            return None
+        version, depth = row
+        value = self._load_blob(thread_id, ns, channel, version)
+        if not isinstance(value, list):
+            return None
+        self._remember_latest(key, (version, value, depth))
+        return self._latest[key]
+
+    def _put_blob(self, thread_id, ns, channel, version, value):
+        latest = self._latest_list(thread_id, ns, channel) if isinstance(value, list) else None
+        kind, base, depth, payload = "full", None, 0, value
+
+        if isinstance(value, list):
+            if latest is not None:
+                prev_version, prev_value, prev_depth = latest
+                n = len(prev_value)
+                if prev_depth < self.snapshot_every and len(value) >= n and value[:n] == prev_value:
+                    kind, base, depth, payload = "delta", prev_version, prev_depth + 1, value[n:]
+            self._remember_latest((thread_id, ns, channel), (version, list(value), depth))
+
+        type_, data = self.serde.dumps_typed(payload)
+        self.db.execute(
+            "INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (thread_id, ns, channel, version, kind, base, depth, type_, data),
+        )
+        # A copy: the caller (LangGraph's channel) may keep mutating the list it passed in
+        self._cache((thread_id, ns, channel, version), list(value) if isinstance(value, list) else value)
+
+    def _load_blob(self, thread_id, ns, channel, version):
+        key = (thread_id, ns, channel, version)
+        if key in self._values:
+            self._values.move_to_end(key)
+            value = self._values[key]
+            return list(value) if isinstance(value, list) else value
+
+        row = self.db.execute(
+            "SELECT kind, base_version, type, data FROM blobs "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+            key,
+        ).fetchone()
+        if row is None:
+            raise KeyError(key)
+
+        kind, base, type_, data = row
+        if kind == "empty":
+            raise KeyError(key)
+        value = self.serde.loads_typed((type_, data))
+        if kind == "delta":
+            value = self._load_blob(thread_id, ns, channel, base) + value
+        self._cache(key, value)
+        return list(value) if isinstance(value, list) else value
+
+    def _load_values(self, thread_id, ns, versions):
+        values = {}
+        for channel, version in versions.items():
+            try:
+                values[channel] = self._load_blob(thread_id, ns, channel, str(version))
+            except KeyError:
+                continue
+        return values
+
+    # --- checkpoint API ------------------------------------------------
+
+    def _tuple(self, thread_id, ns, row):
+        checkpoint_id, parent_id, type_, data, metadata_type, metadata = row
+        checkpoint = self.serde.loads_typed((type_, data))
+        writes = self.db.execute(
+            "SELECT task_id, channel, type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? "
+            "ORDER BY task_path, task_id, idx",
+            (thread_id, ns, checkpoint_id),
+        ).fetchall()
+        return CheckpointTuple(
+            config={"configurable": {
+                "thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": checkpoint_id,
+            }},
+            checkpoint={
+                **checkpoint,
+                "channel_values": self._load_values(thread_id, ns, checkpoint["channel_versions"]),
+            },
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            parent_config=(
+                {"configurable": {
+                    "thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": parent_id,
+                }}
+                if parent_id else None
+            ),
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((t, v))) for task_id, channel, t, v in writes
+            ],
+        )
+
+    def get_tuple(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        query = (
+            "SELECT checkpoint_id, parent_id, type, checkpoint, metadata_type, metadata "
+            "FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+        )
+        with self.lock:
+            if checkpoint_id := get_checkpoint_id(config):
+                row = self.db.execute(
+                    query + " AND checkpoint_id = ?", (thread_id, ns, checkpoint_id)
+                ).fetchone()
+            else:
+                row = self.db.execute(
+                    query + " ORDER BY checkpoint_id DESC LIMIT 1", (thread_id, ns)
+                ).fetchone()
+            return self._tuple(thread_id, ns, row) if row else None
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_id, type, checkpoint, "
+            "metadata_type, metadata FROM checkpoints"
+        )
+        clauses, params = [], []
+        if config:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if (ns := config["configurable"].get("checkpoint_ns")) is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_id)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY checkpoint_id DESC"
+
+        with self.lock:
+            rows = self.db.execute(query, params).fetchall()
+            results = []
+            for thread_id, ns, *row in rows:
+                if limit is not None and len(results) >= limit:
+                    break
+                metadata = self.serde.loads_typed((row[4], row[5]))
+                if filter and not all(metadata.get(k) == v for k, v in filter.items()):
+                    continue
+                results.append(self._tuple(thread_id, ns, row))
+        yield from results
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        c = checkpoint.copy()
+        values = c.pop("channel_values")
+
+        with self.lock:
+            for channel, version in new_versions.items():
+                if channel in values:
+                    self._put_blob(thread_id, ns, channel, str(version), values[channel])
+                else:
+                    self.db.execute(
+                        "INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, 'empty', NULL, 0, '', ?)",
+                        (thread_id, ns, channel, str(version), b""),
+                    )
+            type_, data = self.serde.dumps_typed(c)
+            metadata_type, metadata_data = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+            self.db.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    thread_id, ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                    type_, data, metadata_type, metadata_data,
+                ),
+            )
+            self.db.commit()
+
+        return {"configurable": {
+            "thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": checkpoint["id"],
+        }}
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        # Special writes (errors, interrupts) overwrite; regular writes are idempotent
+        rows = {"INSERT OR REPLACE": [], "INSERT OR IGNORE": []}
+        for idx, (channel, value) in enumerate(writes):
+            type_, data = self.serde.dumps_typed(value)
+            verb = "INSERT OR REPLACE" if channel in WRITES_IDX_MAP else "INSERT OR IGNORE"
+            rows[verb].append((
+                thread_id, ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx),
+                channel, type_, data, task_path,
+            ))
+        with self.lock:
+            for verb, verb_rows in rows.items():
+                self.db.executemany(f"{verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", verb_rows)
+            self.db.commit()
+
+    def delete_thread(self, thread_id):
+        with self.lock:
+            for table in ("checkpoints", "blobs", "writes"):
+                self.db.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+            self.db.commit()
+            self._latest = OrderedDict((k, v) for k, v in self._latest.items() if k[0] != thread_id)
+            self._values.clear()
+        self.collect_blobs()
+
+    # The async API runs the SQLite work (and any wait on `lock` while compaction
+    # holds it) in a worker thread, so an event loop serving many streams never blocks on it
+
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def get_next_version(self, current, channel):
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # --- compaction ----------------------------------------------------
+
+    def compact(self, keep_last=20):
+        """Keep the newest `keep_last` checkpoints per thread and drop everything they don't need."""
+        with self.lock:
+            namespaces = self.db.execute(
+                "SELECT DISTINCT thread_id, checkpoint_ns FROM checkpoints"
+            ).fetchall()
+            for thread_id, ns in namespaces:
+                self._compact_thread(thread_id, ns, keep_last)
+            self.db.commit()
+            self._values.clear()
+        self.collect_blobs()
+
+    def live_refs(self):
+        """Every BlobStore ref held in a stored channel value or pending write."""
+        refs = set()
+        with self.lock:
+            # Deltas hold only the items they append, so together the rows cover every list item once
+            for type_, data in self.db.execute("SELECT type, data FROM blobs WHERE kind != 'empty'"):
+                find_refs(self.serde.loads_typed((type_, data)), refs)
+            for type_, value in self.db.execute("SELECT type, value FROM writes"):
+                find_refs(self.serde.loads_typed((type_, value)), refs)
+        return refs
+
+    def collect_blobs(self):
+        """Delete the `blobs` entries nothing stored here refers to; returns how many."""
+        if self.blobs is None:
+            return 0
+        return self.blobs.collect(self.live_refs())
+
+    def _compact_thread(self, thread_id, ns, keep_last):
+        rows = self.db.execute(
+            "SELECT checkpoint_id, type, checkpoint FROM checkpoints "
+            "WHERE thread_id = ? AND checkpoint_ns = ? ORDER BY checkpoint_id DESC",
+            (thread_id, ns),
+        ).fetchall()
+        if len(rows) <= keep_last:
+            return
+
+        kept, dropped = rows[:keep_last], rows[keep_last:]
+        referenced = set()
+        for _, type_, data in kept:
+            checkpoint = self.serde.loads_typed((type_, data))
+            referenced.update((ch, str(v)) for ch, v in checkpoint["channel_versions"].items())
+
+        # Rewrite deltas whose base is about to disappear as full snapshots.
+        # Newest first, so each rewrite can still read its (older) chain.
+        blobs = self.db.execute(
+            "SELECT channel, version, base_version FROM blobs "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND kind = 'delta' ORDER BY version DESC",
+            (thread_id, ns),
+        ).fetchall()
+        for channel, version, base in blobs:
+            if (channel, version) in referenced and (channel, base) not in referenced:
+                value = self._load_blob(thread_id, ns, channel, version)
+                type_, data = self.serde.dumps_typed(value)
+                self.db.execute(
+                    "UPDATE blobs SET kind = 'full', base_version = NULL, depth = 0, type = ?, data = ? "
+                    "WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                    (type_, data, thread_id, ns, channel, version),
+                )
+                latest = self._latest.get((thread_id, ns, channel))
+                if latest and latest[0] == version:
+                    self._latest[(thread_id, ns, channel)] = (version, latest[1], 0)
+
+        stored = self.db.execute(
+            "SELECT channel, version FROM blobs WHERE thread_id = ? AND checkpoint_ns = ?",
+            (thread_id, ns),
+        ).fetchall()
+        self.db.executemany(
+            "DELETE FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+            [(thread_id, ns, ch, v) for ch, v in stored if (ch, v) not in referenced],
+        )
+        self.db.executemany(
+            "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+            [(thread_id, ns, checkpoint_id) for checkpoint_id, _, _ in dropped],
+        )
+        self.db.executemany(
+            "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+            [(thread_id, ns, checkpoint_id) for checkpoint_id, _, _ in dropped],
+        )
+        # The oldest kept checkpoint no longer has a parent on disk
+        self.db.execute(
+            "UPDATE checkpoints SET parent_id = NULL "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+            (thread_id, ns, kept[-1][0]),
+        )
+
+    def start_compaction(self, interval=60.0, keep_last=20):
+        """Run `compact` every `interval` seconds on a daemon thread."""
+        if self._compactor is not None:
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                self.compact(keep_last)
+
+        self._compactor = threading.Thread(target=run, name="checkpoint-compactor", daemon=True)
+        self._compactor.start()
+
+    def close(self):
+        self._stop.set()
+        if self._compactor is not None:
+            self._compactor.join()
+            self._compactor = None
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,173 @@
+"""
+Shared API clients, built on first use instead of at import time.
+
+All OpenAI traffic (raw SDK clients and LangChain chat models) goes through
+one pooled httpx client for sync calls and one pool per event loop for async
+calls, so keep-alive connections are reused across nodes, examples and threads. That is also where
+common.cassette records and replays calls and where each request's timeout
+is cut to the run deadline (common.deadline). The SDKs themselves are only
+imported when a client is actually built, which keeps module imports and
+`main.py --help` fast and lets modules load without API keys.
+"""
+import asyncio
+import threading
+
+# Connection pool shared by every OpenAI client in the process
+POOL_LIMITS = {"max_connections": 64, "max_keepalive_connections": 32, "keepalive_expiry": 60}
+
+
+class Lazy:
+    """Builds the wrapped object on first attribute access and forwards to it from then on."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._value = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._value is None:
+            with self._lock:
+                if self._value is None:
+                    self._value = self._factory()
+        return self._value
+
+    def __getattr__(self, name):
+        # Protocol probes (copy, pickle, hasattr(x, "__self__")) must not build the client
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self.get(), name)
+
+
+class LazyModel(Lazy):
+    """
+    Lazy chat model, or a Runnable built from one. The Runnable entry points
+    are declared on the proxy, so code that merely inspects `model.invoke`
+    (LangGraph does this when it compiles a graph) doesn't build the client;
+    calling them does.
+    """
+
+    def invoke(self, *args, **kwargs):
+        return self.get().invoke(*args, **kwargs)
+
+    async def ainvoke(self, *args, **kwargs):
+        return await self.get().ainvoke(*args, **kwargs)
+
+    def stream(self, *args, **kwargs):
+        return self.get().stream(*args, **kwargs)
+
+    def astream(self, *args, **kwargs):
+        return self.get().astream(*args, **kwargs)
+
+    def with_structured_output(self, *args, **kwargs):
+        return self.get().with_structured_output(*args, **kwargs)
+
+    def bind_tools(self, *args, **kwargs):
+        return self.get().bind_tools(*args, **kwargs)
+
+
+def once(factory):
+    """Decorator: call `factory` once, thread-safely, and return that result ever after."""
+    lazy = Lazy(factory)
+
+    def get():
+        return lazy.get()
+
+    get.__doc__ = factory.__doc__
+    return get
+
+
+def sdk_httpx():
+    """The httpx package the OpenAI SDK is built on: its httpx2 fork from SDK 3.x on, httpx before that."""
+    try:
+        import httpx2
+        return httpx2
+    except ImportError:
+        import httpx
+        return httpx
+
+
+@once
+def http_client():
+    """Pooled keep-alive httpx client for synchronous OpenAI calls."""
+    httpx = sdk_httpx()
+    from openai import DefaultHttpxClient
+    from common.cassette import cassette_transport
+    from common.deadline import clamp_request
+    limits = httpx.Limits(**POOL_LIMITS)
+    return DefaultHttpxClient(
+        limits=limits, transport=cassette_transport(limits), event_hooks={"request": [clamp_request]}
+    )
+
+
+def loop_pool():
+    """Pooled keep-alive httpx client for async OpenAI calls on the running event loop."""
+    httpx = sdk_httpx()
+    from openai import DefaultAsyncHttpxClient
+    from common.cassette import async_cassette_transport
+    from common.deadline import aclamp_request
+    limits = httpx.Limits(**POOL_LIMITS)
+    return DefaultAsyncHttpxClient(
+        limits=limits, transport=async_cassette_transport(limits), event_hooks={"request": [aclamp_request]}
+    )
+
+
+@once
+def async_http_client():
+    """
+    Async httpx client for OpenAI calls. An httpx pool's connections belong to
+    the event loop that opened them, so each request is sent through a
+    `loop_pool()` owned by the running loop. Clients built once (AsyncOpenAI,
+    ChatOpenAI) keep working across `asyncio.run` calls, and each loop still
+    reuses its own keep-alive connections.
+    """
+    from openai import DefaultAsyncHttpxClient
+
+    class PerLoopAsyncClient(DefaultAsyncHttpxClient):
+        def __init__(self):
+            super().__init__()
+            self._pools = {}
+            self._pools_lock = threading.Lock()
+
+        def pool(self):
+            loop = asyncio.get_running_loop()
+            with self._pools_lock:
+                if (pool := self._pools.get(loop)) is None:
+                    # A closed loop's connections are unusable; drop its pool (and the loop with it)
+                    for closed in [other for other in self._pools if other.is_closed()]:
+                        del self._pools[closed]
+                    pool = self._pools[loop] = loop_pool()
+            return pool
+
+        async def send(self, request, **kwargs):
+            return await self.pool().send(request, **kwargs)
+
+        async def aclose(self):
+            await self.pool().aclose()
+            await super().aclose()
+
+    return PerLoopAsyncClient()
+
+
+@once
+def openai_client():
+    from openai import OpenAI
+    return OpenAI(http_client=http_client())
+
+
+@once
+def async_openai_client():
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(http_client=async_http_client())
+
+
+def chat_model(**params):
+    """ChatOpenAI sharing the pooled httpx clients; wrap in LazyModel to defer building it."""
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(http_client=http_client(), http_async_client=async_http_client(), **params)
+
+
+def tavily_client(pool_size=8):
+    """TavilyClient on a keep-alive requests session sized for `pool_size` concurrent searches."""
+    from tavily import TavilyClient
+    from common.search import pooled_session
+    return TavilyClient(session=pooled_session(pool_size))
@@ -0,0 +1,86 @@
+import re
+
+import numpy as np
+
+from common.tokens import content_terms, estimate_tokens
+
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+class ExtractiveCompressor:
+    """
+    Shrinks research passages to their most relevant sentences, locally.
+    Sentences are scored by TF-IDF cosine similarity to a query (the topic
+    and outline, say) and the best ones are kept until `ratio` of the
+    original tokens is used. Kept sentences stay in their original order
+    and passage, so the writer still reads coherent excerpts.
+    """
+
+    def __init__(self, ratio=0.5, min_words=4):
+        self.ratio = ratio
+        self.min_words = min_words
+
+    def _sentences(self, passages):
+        seen = set()
+        sentences = []
+        for index, passage in enumerate(passages):
+            for sentence in SENTENCE_SPLIT.split(passage):
+                sentence = sentence.strip()
+                # Fragments ("Read more", "Subscribe") and repeats are boilerplate
+                if len(sentence.split()) < self.min_words or sentence.lower() in seen:
+                    continue
+                seen.add(sentence.lower())
+                sentences.append((index, sentence))
+        return sentences
+
+    def scores(self, sentences, query):
+        """Cosine similarity of each sentence to `query` under TF-IDF weighting."""
+        vocabulary = {}
+        rows, cols = [], []
+        for row, sentence in enumerate(sentences):
+            for term in content_terms(sentence):
+                rows.append(row)
+                cols.append(vocabulary.setdefault(term, len(vocabulary)))
+        if not vocabulary:
+            return np.zeros(len(sentences))
+
+        counts = np.zeros((len(sentences), len(vocabulary)))
+        np.add.at(counts, (rows, cols), 1)
+        doc_freq = np.count_nonzero(counts, axis=0)
+        idf = np.log((1 + len(sentences)) / (1 + doc_freq)) + 1
+        matrix = np.log1p(counts) * idf
+
+        query_vector = np.zeros(len(vocabulary))
+        for term in content_terms(query):
+            if (col := vocabulary.get(term)) is not None:
+                query_vector[col] += 1
+        query_vector = np.log1p(query_vector) * idf
+
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query_vector)
+        return np.divide(matrix @ query_vector, norms, out=np.zeros(len(sentences)), where=norms > 0)
+
+    def compress(self, passages, query):
+        """Return `passages` cut down to their best sentences, within `ratio` of their tokens."""
+        sentences = self._sentences(passages)
+        if not sentences:
+            return list(passages)
+
+        budget = self.ratio * sum(estimate_tokens(p) for p in passages)
+        scores = self.scores([s for _, s in sentences], query)
+        # Sentences sharing no terms with the query are never worth their tokens,
+        # unless nothing matches at all; then keep the opening sentences in reading order
+        ranked = [i for i in np.argsort(-scores, kind="stable") if scores[i] > 0] or range(len(sentences))
+        keep = []
+        used = 0
+        for i in ranked:
+            cost = estimate_tokens(sentences[i][1])
+            if used + cost > budget:
+                continue
+            keep.append(i)
+            used += cost
+
+        kept = {}
+        for i in sorted(keep):
+            index, sentence = sentences[i]
+            kept.setdefault(index, []).append(sentence)
+        return [" ".join(kept[index]) for index in sorted(kept)]
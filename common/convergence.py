@@ -0,0 +1,131 @@
+import difflib
+import re
+from dataclasses import dataclass
+
+from common.tokens import estimate_tokens, tokenize
+
+EMPTY_USAGE = {"llm_calls": 0, "tokens": 0}
+
+
+def add_usage(current, update):
+    """State reducer for per-run LLM usage: sums node updates; None starts a fresh run."""
+    if update is None:
+        return dict(EMPTY_USAGE)
+    current = current or EMPTY_USAGE
+    return {key: current.get(key, 0) + update.get(key, 0) for key in EMPTY_USAGE}
+
+
+def call_usage(response, prompt=""):
+    """Usage update for one LLM call: the reported token count when there is one, else an estimate."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage:
+        tokens = usage["total_tokens"]
+    else:
+        output = getattr(response, "content", None) or str(response)
+        tokens = estimate_tokens(prompt) + estimate_tokens(output)
+    return {"llm_calls": 1, "tokens": tokens}
+
+
+@dataclass
+class Round:
+    """What a check can see at one point in the loop; anything not known there is None."""
+    draft: str | None = None
+    previous_draft: str | None = None
+    critique: str | None = None
+    usage: dict | None = None
+
+
+class DraftDelta:
+    """Stop once a revision changes less than `min_change` (0-1) of the previous draft's words."""
+
+    def __init__(self, min_change=0.05):
+        self.min_change = min_change
+
+    def __call__(self, round):
+        if not round.draft or not round.previous_draft:
+            return None
+
+        matcher = difflib.SequenceMatcher(None, round.previous_draft.split(), round.draft.split(), autojunk=False)
+        # Both quick ratios are upper bounds, so real rewrites skip the full diff
+        if 1 - matcher.real_quick_ratio() >= self.min_change or 1 - matcher.quick_ratio() >= self.min_change:
+            return None
+        change = 1 - matcher.ratio()
+        if change < self.min_change:
+            return f"draft changed {change:.1%} since the last revision"
+        return None
+
+
+# Words that mark a critique sentence as raising a real problem
+SEVERE_TERMS = {
+    "missing", "lacks", "lacking", "unclear", "vague", "weak", "incorrect", "inaccurate",
+    "confusing", "generic", "unsupported", "fails", "gap", "gaps", "must", "needs", "should",
+}
+APPROVAL_PATTERN = re.compile(
+    r"\b(no (major|significant|substantive) (issues|problems|changes)|ready to (publish|post|go)"
+    r"|well[- ]written|excellent|strong overall)\b",
+    re.IGNORECASE,
+)
+
+
+def critique_severity(text):
+    """Heuristic 0-1 severity: the share of sentences that raise a substantive problem."""
+    sentences = [s for s in re.split(r"(?<=[.!?])\s+|\n+", text) if s.strip()]
+    if not sentences:
+        return 0.0
+    flagged = sum(1 for s in sentences if SEVERE_TERMS & set(tokenize(s)))
+    score = flagged / len(sentences)
+    if APPROVAL_PATTERN.search(text):
+        score /= 2
+    return score
+
+
+class CritiqueSeverity:
+    """Stop when the critique scores below `threshold`, i.e. it only asks for polish."""
+
+    def __init__(self, threshold=0.2, scorer=critique_severity):
+        self.threshold = threshold
+        self.scorer = scorer
+
+    def __call__(self, round):
+        if not round.critique:
+            return None
+        severity = self.scorer(round.critique)
+        if severity < self.threshold:
+            return f"critique severity {severity:.2f} is below {self.threshold:.2f}"
+        return None
+
+
+class CallBudget:
+    """Stop once the run has used `max_llm_calls` calls or `max_tokens` tokens (either may be None)."""
+
+    def __init__(self, max_llm_calls=None, max_tokens=None):
+        self.max_llm_calls = max_llm_calls
+        self.max_tokens = max_tokens
+
+    def __call__(self, round):
+        usage = round.usage or EMPTY_USAGE
+        if self.max_llm_calls is not None and usage["llm_calls"] >= self.max_llm_calls:
+            return f"LLM call budget spent ({usage['llm_calls']}/{self.max_llm_calls})"
+        if self.max_tokens is not None and usage["tokens"] >= self.max_tokens:
+            return f"token budget spent ({usage['tokens']}/{self.max_tokens})"
+        return None
+
+
+class ConvergenceDetector:
+    """
+    Decides when a generate/critique loop has stopped paying for itself.
+    Each check is a callable taking a Round and returning a reason to stop,
+    or None; the first reason wins. Nodes store it in `stop_reason`, so the
+    routing functions can end the loop and the final state says why.
+    """
+
+    def __init__(self, checks):
+        self.checks = list(checks)
+
+    def check(self, **fields):
+        """Return the reason to stop, or '' to keep going."""
+        round = Round(**fields)
+        for check in self.checks:
+            if reason := check(round):
+                return reason
+        return ""
@@ -0,0 +1,395 @@
+"""
+Per-run deadlines, deadline-aware retries and hedged requests.
+
+A run's deadline lives in a context variable, so every call made while the
+run is served sees the same budget, whichever node, worker thread or task
+LangGraph runs it in:
+
+    with run_deadline(60):
+        graph.invoke(inputs, config)
+
+- The shared HTTP clients (common.clients, common.search) clamp each
+  request's timeout to the time left, and refuse to start one once it's gone.
+- CallPolicy retries failed calls with full-jitter backoff, but only while
+  the backoff plus a useful attempt still fits in the budget.
+- With hedge=True, a call still running after its recent p95 latency gets
+  one duplicate, and whichever returns first wins. Latency is tracked per
+  call site (graph node and function), so a short call isn't measured
+  against the p95 of a long one sharing the policy. METRICS counts hedges
+  and hedge wins, so you can see whether hedging pays for its extra calls.
+"""
+import asyncio
+import contextvars
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+from langchain_core.runnables import RunnableLambda
+
+from common.metrics import METRICS, current_node
+from common.wrappers import ClientWrapper
+
+_deadline = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """The run's deadline passed before the call could finish."""
+
+
+class Deadline:
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return self.expires_at - time.monotonic()
+
+    def expired(self):
+        return self.remaining() <= 0
+
+
+def current_deadline():
+    return _deadline.get()
+
+
+@contextmanager
+def run_deadline(seconds):
+    """Give everything run inside the block `seconds` in total; None means no deadline. Nested deadlines only shrink."""
+    outer = _deadline.get()
+    if seconds is None:
+        deadline = outer
+    else:
+        deadline = Deadline(seconds)
+        if outer is not None and outer.expires_at < deadline.expires_at:
+            deadline = outer
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+
+def with_deadline(runnable, seconds):
+    """
+    Runnable that runs `runnable` under its own `seconds` deadline per input,
+    so each run of a batch gets a full budget instead of sharing one.
+    """
+    def invoke(value, config):
+        with run_deadline(seconds):
+            return runnable.invoke(value, config)
+
+    async def ainvoke(value, config):
+        with run_deadline(seconds):
+            return await runnable.ainvoke(value, config)
+
+    return RunnableLambda(invoke, afunc=ainvoke, name="with_deadline")
+
+
+def clamp_timeout(timeout):
+    """`timeout` (seconds or None) cut to the current deadline; raises once the deadline has passed."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return timeout
+    remaining = deadline.remaining()
+    if remaining <= 0:
+        raise DeadlineExceeded(f"deadline of {deadline.seconds:g}s exceeded")
+    return remaining if timeout is None else min(timeout, remaining)
+
+
+def clamp_request(request):
+    """httpx request hook: fit every timeout of `request` into the current deadline."""
+    timeouts = request.extensions.get("timeout")
+    if _deadline.get() is not None and timeouts:
+        request.extensions["timeout"] = {name: clamp_timeout(value) for name, value in timeouts.items()}
+
+
+async def aclamp_request(request):
+    clamp_request(request)
+
+
+def retryable(error):
+    """Timeouts, dropped connections, rate limits and server errors are worth another try; bad requests aren't."""
+    if isinstance(error, DeadlineExceeded):
+        return False
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status in (408, 409, 429) or status >= 500
+    if isinstance(error, (TimeoutError, ConnectionError, OSError)):
+        return True
+    name = type(error).__name__
+    return "Timeout" in name or "Connection" in name
+
+
+class LatencyTracker:
+    """Sliding window of one call's recent latencies, optionally only those from the last `max_age` seconds."""
+
+    def __init__(self, window=200, min_samples=20, max_age=None):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+        self.max_age = max_age
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self.samples.append((time.monotonic(), seconds))
+
+    def recent(self):
+        with self._lock:
+            if self.max_age is None:
+                return [seconds for _, seconds in self.samples]
+            cutoff = time.monotonic() - self.max_age
+            return [seconds for at, seconds in self.samples if at >= cutoff]
+
+    def quantile(self, q):
+        """The `q` quantile of the window, or None until there are `min_samples` samples."""
+        samples = self.recent()
+        if len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+# Hedged sync calls race in these threads; a losing attempt can't be interrupted,
+# but the deadline clamp on its HTTP request bounds how long it can linger
+_hedge_pool = None
+_hedge_pool_lock = threading.Lock()
+
+
+def hedge_pool():
+    global _hedge_pool
+    with _hedge_pool_lock:
+        if _hedge_pool is None:
+            _hedge_pool = ThreadPoolExecutor(max_workers=64, thread_name_prefix="hedge")
+    return _hedge_pool
+
+
+class CallPolicy:
+    """
+    Retry and hedging rules for one kind of call (e.g. "llm" or "search"),
+    applied with `call`/`acall` (or `stream`/`astream` for streamed replies).
+    Attempts never outlive the current run deadline. Only errors for which
+    `retry_on(error)` is true are retried.
+    """
+
+    def __init__(self, name, retries=2, base_delay=0.5, max_delay=8.0, min_attempt=1.0,
+                 hedge=False, hedge_quantile=0.95, retry_on=retryable, metrics=METRICS):
+        self.name = name
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.min_attempt = min_attempt
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.retry_on = retry_on
+        self.metrics = metrics
+        # (node, function) -> LatencyTracker
+        self.latency = {}
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        self.metrics.count(name, call=self.name)
+
+    def tracker(self, fn):
+        """Latency window for calls to `fn` from the current graph node."""
+        key = (current_node(), getattr(fn, "__qualname__", None) or repr(fn))
+        with self._lock:
+            if key not in self.latency:
+                self.latency[key] = LatencyTracker()
+            return self.latency[key]
+
+    def backoff(self, attempt):
+        """Full jitter: uniform in [0, min(max_delay, base_delay * 2**attempt)]."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _retry_delay(self, attempt, error):
+        """Seconds to wait before the next attempt, or None if `error` should be raised now."""
+        if attempt >= self.retries or not self.retry_on(error):
+            return None
+        delay = self.backoff(attempt)
+        deadline = _deadline.get()
+        if deadline is not None and deadline.remaining() < delay + self.min_attempt:
+            return None
+        self._count("call_retries_total")
+        return delay
+
+    def _remaining(self):
+        deadline = _deadline.get()
+        if deadline is None:
+            return None
+        remaining = deadline.remaining()
+        if remaining <= 0:
+            self._count("call_deadline_exceeded_total")
+            raise DeadlineExceeded(f"{self.name}: deadline of {deadline.seconds:g}s exceeded")
+        return remaining
+
+    @staticmethod
+    def _timed(latency, fn, args, kwargs):
+        started = time.perf_counter()
+        result = fn(*args, **kwargs)
+        latency.add(time.perf_counter() - started)
+        return result
+
+    # --- sync ----------------------------------------------------------------
+
+    def call(self, fn, *args, **kwargs):
+        for attempt in range(self.retries + 1):
+            try:
+                return self._attempt(fn, args, kwargs)
+            except Exception as e:
+                delay = self._retry_delay(attempt, e)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+
+    def _attempt(self, fn, args, kwargs):
+        remaining = self._remaining()
+        latency = self.tracker(fn)
+        hedge_after = latency.quantile(self.hedge_quantile) if self.hedge else None
+        if hedge_after is None or (remaining is not None and remaining <= hedge_after):
+            # Nothing to race: the HTTP clamp keeps the call inside the deadline
+            return self._timed(latency, fn, args, kwargs)
+
+        pool = hedge_pool()
+        primary = pool.submit(contextvars.copy_context().run, self._timed, latency, fn, args, kwargs)
+        done, _ = wait([primary], timeout=hedge_after)
+        if done:
+            return primary.result()
+
+        self._count("call_hedges_total")
+        hedge = pool.submit(contextvars.copy_context().run, self._timed, latency, fn, args, kwargs)
+        pending = {primary, hedge}
+        first_error = None
+        while pending:
+            remaining = self._remaining()
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            if not done:
+                self._count("call_deadline_exceeded_total")
+                raise DeadlineExceeded(f"{self.name}: deadline exceeded while hedging")
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self._count("call_hedge_wins_total")
+                    return future.result()
+                first_error = first_error or future.exception()
+        raise first_error
+
+    def stream(self, fn, *args, **kwargs):
+        """
+        Yield from the stream `fn(*args, **kwargs)`, retrying only failures
+        before the first chunk (after that the chunks are already out).
+        Streams are not hedged, and the deadline is checked between chunks.
+        """
+        for attempt in range(self.retries + 1):
+            started = False
+            try:
+                self._remaining()
+                latency = self.tracker(fn)
+                began = time.perf_counter()
+                for chunk in fn(*args, **kwargs):
+                    if not started:
+                        started = True
+                        latency.add(time.perf_counter() - began)
+                    yield chunk
+                    self._remaining()
+                return
+            except Exception as e:
+                delay = None if started else self._retry_delay(attempt, e)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+
+    # --- async ---------------------------------------------------------------
+
+    async def acall(self, fn, *args, **kwargs):
+        for attempt in range(self.retries + 1):
+            try:
+                return await self._aattempt(fn, args, kwargs)
+            except Exception as e:
+                delay = self._retry_delay(attempt, e)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+
+    @staticmethod
+    async def _atimed(latency, fn, args, kwargs):
+        started = time.perf_counter()
+        result = await fn(*args, **kwargs)
+        latency.add(time.perf_counter() - started)
+        return result
+
+    async def _aattempt(self, fn, args, kwargs):
+        remaining = self._remaining()
+        latency = self.tracker(fn)
+        hedge_after = latency.quantile(self.hedge_quantile) if self.hedge else None
+        primary = asyncio.ensure_future(self._atimed(latency, fn, args, kwargs))
+        tasks = {primary}
+        try:
+            if hedge_after is not None and (remaining is None or remaining > hedge_after):
+                done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+                if not done:
+                    self._count("call_hedges_total")
+                    tasks.add(asyncio.ensure_future(self._atimed(latency, fn, args, kwargs)))
+
+            first_error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, timeout=self._remaining(), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self._count("call_deadline_exceeded_total")
+                    raise DeadlineExceeded(f"{self.name}: deadline exceeded")
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self._count("call_hedge_wins_total")
+                        return task.result()
+                    first_error = first_error or task.exception()
+            raise first_error
+        finally:
+            # Unlike threads, a losing or abandoned coroutine can be cancelled, which also closes its request
+            for task in tasks:
+                task.cancel()
+
+    async def astream(self, fn, *args, **kwargs):
+        """Async counterpart of stream."""
+        for attempt in range(self.retries + 1):
+            started = False
+            try:
+                self._remaining()
+                latency = self.tracker(fn)
+                began = time.perf_counter()
+                async for chunk in fn(*args, **kwargs):
+                    if not started:
+                        started = True
+                        latency.add(time.perf_counter() - began)
+                    yield chunk
+                    self._remaining()
+                return
+            except Exception as e:
+                delay = None if started else self._retry_delay(attempt, e)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+
+
+def resilient(runnable, policy):
+    """Runnable that calls `runnable` under `policy`; like rate_limited, the model may be a LazyModel."""
+    def invoke(value, config):
+        return policy.call(runnable.invoke, value, config)
+
+    async def ainvoke(value, config):
+        return await policy.acall(runnable.ainvoke, value, config)
+
+    return RunnableLambda(invoke, afunc=ainvoke, name=f"resilient_{policy.name}")
+
+
+class ResilientSearchClient(ClientWrapper):
+    """Search client wrapper whose `search` runs under a CallPolicy."""
+
+    def __init__(self, client, policy):
+        self.client = client
+        self.policy = policy
+
+    def search(self, query, **params):
+        return self.policy.call(self.client.search, query=query, **params)
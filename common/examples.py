@@ -0,0 +1,36 @@
+import importlib.util
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Short name -> example directory
+EXAMPLES = {
+    'react': '01-simple-react-agent',
+    'langgraph': '02-building-with-langgraph',
+    'reflection': '03-reflection',
+    'reflexion': '04-reflexion',
+}
+
+
+def load_example(name):
+    """
+    Import an example's main.py as a module without running its demo.
+    The example directory goes on sys.path so its sibling modules resolve.
+    """
+    directory = ROOT / EXAMPLES[name]
+    module_name = f"example_{name}"
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+
+    if str(directory) not in sys.path:
+        sys.path.insert(0, str(directory))
+    spec = importlib.util.spec_from_file_location(module_name, directory / "main.py")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[module_name]
+        raise
+    return module
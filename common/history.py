@@ -0,0 +1,78 @@
+from collections import deque
+
+from common.tokens import estimate_tokens
+
+# Per-message overhead the chat format adds on top of the content itself
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class TokenBudgetHistory:
+    """
+    Chat history that stays within a token budget.
+    The system prompt, the first user question and the newest `keep_last`
+    messages are always kept. When the budget is exceeded, older observations
+    are compacted first and the oldest turns are dropped after that.
+    Token counts are tracked per message as they are added, so staying under
+    budget never requires rescanning the whole history.
+    """
+
+    def __init__(self, system='', budget=4000, keep_last=6, compact_chars=200):
+        self.budget = budget
+        self.keep_last = keep_last
+        self.compact_chars = compact_chars
+        self.pinned = []
+        self.turns = deque()
+        self.total_tokens = 0
+        self._compacted = 0
+
+        if system:
+            self._pin({'role': 'system', 'content': system})
+
+    @property
+    def messages(self):
+        return self.pinned + [message for message, _ in self.turns]
+
+    def append(self, message):
+        if not any(m['role'] == 'user' for m in self.pinned) and message['role'] == 'user':
+            self._pin(message)
+            return
+
+        tokens = self._count(message)
+        self.turns.append((message, tokens))
+        self.total_tokens += tokens
+        self._enforce_budget()
+
+    def _pin(self, message):
+        self.pinned.append(message)
+        self.total_tokens += self._count(message)
+
+    def _count(self, message):
+        return estimate_tokens(message['content'] or '') + MESSAGE_OVERHEAD_TOKENS
+
+    def _enforce_budget(self):
+        if self.budget is None:
+            return
+
+        # Compact observations that have left the recent window; each one only once
+        while self.total_tokens > self.budget and self._compacted < len(self.turns) - self.keep_last:
+            message, tokens = self.turns[self._compacted]
+            content = message['content'] or ''
+            observation = message['role'] == 'tool' or (message['role'] == 'user' and content.startswith('Observation:'))
+            if observation and len(content) > self.compact_chars:
+                compacted = {**message, 'content': content[:self.compact_chars] + ' ...[truncated]'}
+                new_tokens = self._count(compacted)
+                self.turns[self._compacted] = (compacted, new_tokens)
+                self.total_tokens += new_tokens - tokens
+            self._compacted += 1
+
+        # Still over budget: drop the oldest turns outside the recent window
+        while self.total_tokens > self.budget and len(self.turns) > self.keep_last:
+            self._drop_oldest()
+            # Tool results can't outlive the assistant message that called for them
+            while self.turns and self.turns[0][0]['role'] == 'tool':
+                self._drop_oldest()
+
+    def _drop_oldest(self):
+        _, tokens = self.turns.popleft()
+        self.total_tokens -= tokens
+        self._compacted = max(0, self._compacted - 1)
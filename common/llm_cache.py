@@ -0,0 +1,70 @@
+from langchain_core.caches import BaseCache
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration
+
+from common.cache import CACHE_DIR, DiskCache, cache_key
+
+
+def cassette_in_use():
+    # Imported here: common.cassette pulls in httpx, which plain cache users don't need
+    from common.cassette import in_use
+    return in_use()
+
+
+class ResponseCache:
+    """
+    Persistent exact-match cache for chat completions.
+    Only deterministic calls (temperature=0) are cached unless
+    `cache_nondeterministic` is set, since replaying a sampled answer
+    would silently change behaviour. Nothing is cached while a cassette
+    records or replays (see common.cassette).
+    """
+
+    def __init__(self, path=None, max_entries=2_000, cache_nondeterministic=False):
+        self.cache = DiskCache(path or CACHE_DIR / "llm.sqlite", max_entries=max_entries)
+        self.cache_nondeterministic = cache_nondeterministic
+
+    def cacheable(self, temperature):
+        return (self.cache_nondeterministic or temperature == 0) and not cassette_in_use()
+
+    def lookup(self, model, params, messages):
+        """Return the cached response for this exact request, or None."""
+        if not self.cacheable(params.get("temperature")):
+            return None
+        return self.cache.get(cache_key(model, params, messages))
+
+    def store(self, model, params, messages, response):
+        if self.cacheable(params.get("temperature")):
+            self.cache.set(cache_key(model, params, messages), response)
+
+    def for_chat_model(self, temperature):
+        """Value for a LangChain chat model's `cache=` argument."""
+        return LangChainResponseCache(self) if self.cacheable(temperature) else False
+
+    def stats(self):
+        return self.cache.stats()
+
+
+class LangChainResponseCache(BaseCache):
+    """Adapter exposing a ResponseCache through LangChain's cache interface."""
+
+    def __init__(self, responses):
+        self.responses = responses
+
+    def lookup(self, prompt, llm_string):
+        if cassette_in_use():
+            return None
+        cached = self.responses.cache.get(cache_key(llm_string, prompt))
+        if cached is None:
+            return None
+        # Marked so MetricsCallbackHandler counts a hit instead of billing the stored usage again
+        return [ChatGeneration(message=m, generation_info={"cached": True}) for m in messages_from_dict(cached)]
+
+    def update(self, prompt, llm_string, return_val):
+        if cassette_in_use():
+            return
+        messages = [message_to_dict(g.message) for g in return_val]
+        self.responses.cache.set(cache_key(llm_string, prompt), messages)
+
+    def clear(self, **kwargs):
+        self.responses.cache.clear()
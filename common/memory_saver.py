@@ -0,0 +1,242 @@
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from langgraph.checkpoint.memory import InMemorySaver
+
+
+class ThreadSpill:
+    """
+    SQLite file that holds threads evicted from a BoundedMemorySaver.
+    A thread is stored as one pickled record and removed again when it
+    is reloaded, so each thread lives either in memory or here, never both.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS threads (thread_id TEXT PRIMARY KEY, data BLOB NOT NULL)")
+        self._db.commit()
+
+    def save(self, thread_id, data):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO threads (thread_id, data) VALUES (?, ?)",
+                (thread_id, pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)),
+            )
+            self._db.commit()
+
+    def load(self, thread_id):
+        """Return and remove the spilled thread, or None if it was never spilled."""
+        with self._lock:
+            row = self._db.execute("SELECT data FROM threads WHERE thread_id = ?", (thread_id,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute("DELETE FROM threads WHERE thread_id = ?", (thread_id,))
+            self._db.commit()
+        return pickle.loads(row[0])
+
+    def delete(self, thread_id):
+        with self._lock:
+            self._db.execute("DELETE FROM threads WHERE thread_id = ?", (thread_id,))
+            self._db.commit()
+
+
+class BoundedMemorySaver(InMemorySaver):
+    """
+    InMemorySaver that stays within `max_threads` threads and `max_bytes`
+    of serialized checkpoint data, for long-running processes serving many users.
+
+    Threads are kept in LRU order, and every read or write refreshes a thread.
+    After each write or read, the least recently used threads are evicted until
+    both limits hold, along with any thread idle for longer than `idle_ttl`
+    seconds. The thread being used is never evicted. With a `spill` store (such as
+    ThreadSpill), evicted threads are saved there and reloaded the next time
+    they are used. Without one they are dropped. Every thread still in memory
+    behaves exactly as with InMemorySaver, `get_state` included.
+    """
+
+    def __init__(self, *, max_threads=1_000, max_bytes=256 * 2 ** 20, idle_ttl=None, spill=None, serde=None):
+        super().__init__(serde=serde)
+        self.max_threads = max_threads
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.spill = spill
+        self.total_bytes = 0
+        self.evictions = 0
+        self.spilled = 0
+        self.reloaded = 0
+        # thread_id -> {"used": last use, "bytes": size, "blobs": keys, "writes": keys}, oldest first
+        self._threads = OrderedDict()
+        self._lock = threading.RLock()
+
+    # --- bookkeeping -------------------------------------------------------
+
+    def _touch(self, thread_id):
+        """Mark a thread as just used, reloading it from the spill store if needed."""
+        entry = self._threads.get(thread_id)
+        if entry is None:
+            entry = {"used": 0.0, "bytes": 0, "blobs": set(), "writes": set()}
+            self._threads[thread_id] = entry
+            if self.spill is not None and (data := self.spill.load(thread_id)) is not None:
+                self._restore(thread_id, entry, data)
+        entry["used"] = time.monotonic()
+        self._threads.move_to_end(thread_id)
+        return entry
+
+    def _resize(self, entry, delta):
+        entry["bytes"] += delta
+        self.total_bytes += delta
+
+    def _blob_size(self, key):
+        value = self.blobs.get(key)
+        return len(value[1]) if value else 0
+
+    def _writes_size(self, key):
+        return sum(len(write[2][1]) for write in self.writes.get(key, {}).values())
+
+    def _snapshot(self, thread_id, entry):
+        return {
+            "storage": {ns: dict(checkpoints) for ns, checkpoints in self.storage.get(thread_id, {}).items()},
+            "blobs": {key: self.blobs[key] for key in entry["blobs"] if key in self.blobs},
+            "writes": {key: dict(self.writes[key]) for key in entry["writes"] if key in self.writes},
+        }
+
+    def _restore(self, thread_id, entry, data):
+        for ns, checkpoints in data["storage"].items():
+            self.storage[thread_id][ns].update(checkpoints)
+            self._resize(entry, sum(len(c[0][1]) + len(c[1][1]) for c in checkpoints.values()))
+        for key, value in data["blobs"].items():
+            self.blobs[key] = value
+            entry["blobs"].add(key)
+            self._resize(entry, len(value[1]))
+        for key, value in data["writes"].items():
+            self.writes[key].update(value)
+            entry["writes"].add(key)
+            self._resize(entry, self._writes_size(key))
+        self.reloaded += 1
+
+    def _drop(self, thread_id):
+        entry = self._threads.pop(thread_id, None)
+        self.storage.pop(thread_id, None)
+        if entry is None:
+            return
+        for key in entry["blobs"]:
+            self.blobs.pop(key, None)
+        for key in entry["writes"]:
+            self.writes.pop(key, None)
+        self.total_bytes -= entry["bytes"]
+
+    def _evict(self, thread_id):
+        entry = self._threads[thread_id]
+        if self.spill is not None:
+            self.spill.save(thread_id, self._snapshot(thread_id, entry))
+            self.spilled += 1
+        self._drop(thread_id)
+        self.evictions += 1
+
+    def _enforce_limits(self, keep):
+        now = time.monotonic()
+        while self._threads:
+            oldest, entry = next(iter(self._threads.items()))
+            if oldest == keep:
+                break
+            over = len(self._threads) > self.max_threads or self.total_bytes > self.max_bytes
+            idle = self.idle_ttl is not None and now - entry["used"] > self.idle_ttl
+            if not (over or idle):
+                break
+            self._evict(oldest)
+
+    def evict_idle(self):
+        """Evict every thread idle for longer than `idle_ttl`; call this periodically in quiet processes."""
+        with self._lock:
+            self._enforce_limits(keep=None)
+
+    # --- checkpointer interface --------------------------------------------
+
+    def get_tuple(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            self._touch(thread_id)
+            result = super().get_tuple(config)
+            if result is None and not self._threads[thread_id]["bytes"]:
+                # Unknown thread: don't keep an empty placeholder around
+                self._drop(thread_id)
+            else:
+                self._enforce_limits(keep=thread_id)
+            return result
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        with self._lock:
+            if config and (thread_id := config["configurable"].get("thread_id")):
+                self._touch(thread_id)
+            items = list(super().list(config, filter=filter, before=before, limit=limit))
+            if config and thread_id:
+                self._enforce_limits(keep=thread_id)
+        yield from items
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"]["checkpoint_ns"]
+        with self._lock:
+            entry = self._touch(thread_id)
+            blob_keys = [(thread_id, ns, channel, version) for channel, version in new_versions.items()]
+            before = sum(self._blob_size(key) for key in blob_keys)
+            if previous := self.storage.get(thread_id, {}).get(ns, {}).get(checkpoint["id"]):
+                before += len(previous[0][1]) + len(previous[1][1])
+            result = super().put(config, checkpoint, metadata, new_versions)
+
+            stored = self.storage[thread_id][ns][checkpoint["id"]]
+            entry["blobs"].update(blob_keys)
+            self._resize(entry, sum(self._blob_size(key) for key in blob_keys) - before)
+            self._resize(entry, len(stored[0][1]) + len(stored[1][1]))
+            self._enforce_limits(keep=thread_id)
+            return result
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        thread_id = config["configurable"]["thread_id"]
+        key = (thread_id, config["configurable"]["checkpoint_ns"], config["configurable"]["checkpoint_id"])
+        with self._lock:
+            entry = self._touch(thread_id)
+            before = self._writes_size(key)
+            super().put_writes(config, writes, task_id, task_path)
+            entry["writes"].add(key)
+            self._resize(entry, self._writes_size(key) - before)
+            self._enforce_limits(keep=thread_id)
+
+    def delete_thread(self, thread_id):
+        with self._lock:
+            self._drop(thread_id)
+            if self.spill is not None:
+                self.spill.delete(thread_id)
+
+    async def aget_tuple(self, config):
+        return self.get_tuple(config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        for item in self.list(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        return self.delete_thread(thread_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "threads": len(self._threads),
+                "bytes": self.total_bytes,
+                "evictions": self.evictions,
+                "spilled": self.spilled,
+                "reloaded": self.reloaded,
+            }
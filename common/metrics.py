@@ -0,0 +1,355 @@
+import inspect
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from types import SimpleNamespace
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from common.wrappers import ClientWrapper
+
+# USD per million (prompt, completion) tokens; models match on the longest prefix
+PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4.1": (2.00, 8.00),
+}
+
+HELP = {
+    "node_seconds": ("summary", "Wall time per graph node"),
+    "llm_calls_total": ("counter", "LLM calls"),
+    "llm_seconds": ("summary", "LLM call latency"),
+    "llm_time_to_first_token_seconds": ("summary", "Time to first streamed token"),
+    "llm_prompt_tokens_total": ("counter", "Prompt tokens sent"),
+    "llm_completion_tokens_total": ("counter", "Completion tokens received"),
+    "llm_cost_usd_total": ("counter", "Estimated LLM spend in USD"),
+    "llm_cache_hits_total": ("counter", "LLM calls answered from a response cache (no tokens, no cost)"),
+    "search_seconds": ("summary", "Search call latency"),
+    "cache_hits_total": ("counter", "Cache hits"),
+    "cache_misses_total": ("counter", "Cache misses"),
+    "call_retries_total": ("counter", "Calls retried after a failure"),
+    "call_hedges_total": ("counter", "Hedged duplicate requests sent"),
+    "call_hedge_wins_total": ("counter", "Hedged requests that returned first"),
+    "call_deadline_exceeded_total": ("counter", "Calls stopped by the run deadline"),
+    "model_routes_total": ("counter", "LLM calls served per node and model tier"),
+    "model_failures_total": ("counter", "Retryable LLM call failures per node and model tier"),
+}
+
+
+def current_node():
+    """The LangGraph node the calling code runs in, if any."""
+    from langchain_core.runnables.config import var_child_runnable_config
+    config = var_child_runnable_config.get() or {}
+    return config.get("metadata", {}).get("langgraph_node")
+
+
+def cost(model, prompt_tokens, completion_tokens):
+    """Estimated USD cost of one call, or 0.0 for a model missing from PRICES."""
+    matches = [key for key in PRICES if (model or "").startswith(key)]
+    if not matches:
+        return 0.0
+    prompt_price, completion_price = PRICES[max(matches, key=len)]
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+
+class Metrics:
+    """
+    Thread-safe collector shared by every instrumented graph and client.
+    Each observation is kept as a JSON record until `write_jsonl` drains it,
+    and is also folded into running totals for the Prometheus text export,
+    so a long-running process holds only the records since its last flush.
+    """
+
+    def __init__(self, prefix="langgraph_mastery"):
+        self.prefix = prefix
+        self.records = []
+        self.caches = {}
+        self._totals = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def _add(self, name, labels, value):
+        self._totals[(name, tuple(sorted(labels.items())))] += value
+
+    def observe(self, kind, name, seconds, **fields):
+        """Record one timed event (a node run, LLM call or search) and its extra fields."""
+        record = {"time": time.time(), "kind": kind, "name": name, "seconds": seconds, **fields}
+        with self._lock:
+            self.records.append(record)
+            if kind == "node":
+                self._observe_summary("node_seconds", {"node": name}, seconds)
+            elif kind == "search":
+                self._observe_summary("search_seconds", {"client": name}, seconds)
+            elif kind == "llm":
+                labels = {"node": name, "model": fields.get("model") or "unknown"}
+                prompt, completion = fields.get("prompt_tokens", 0), fields.get("completion_tokens", 0)
+                self._add("llm_calls_total", labels, 1)
+                self._observe_summary("llm_seconds", labels, seconds)
+                if fields.get("time_to_first_token") is not None:
+                    self._observe_summary("llm_time_to_first_token_seconds", labels, fields["time_to_first_token"])
+                self._add("llm_prompt_tokens_total", labels, prompt)
+                self._add("llm_completion_tokens_total", labels, completion)
+                self._add("llm_cost_usd_total", labels, fields.get("cost_usd", 0.0))
+
+    def _observe_summary(self, name, labels, seconds):
+        self._add(f"{name}_count", labels, 1)
+        self._add(f"{name}_sum", labels, seconds)
+
+    def count(self, name, value=1, **labels):
+        """Add `value` to the counter `name` (see HELP) under `labels`."""
+        with self._lock:
+            self._add(name, labels, value)
+
+    def record_llm(self, node, model, seconds, prompt_tokens=0, completion_tokens=0, time_to_first_token=None):
+        self.observe(
+            "llm", node, seconds,
+            model=model,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            time_to_first_token=time_to_first_token,
+            cost_usd=cost(model, prompt_tokens, completion_tokens),
+        )
+
+    def track_cache(self, name, cache):
+        """Report hit/miss counts of anything with a DiskCache-style `stats()`."""
+        self.caches[name] = cache
+
+    def totals(self):
+        with self._lock:
+            totals = dict(self._totals)
+        for name, cache in self.caches.items():
+            stats = cache.stats()
+            totals[("cache_hits_total", (("cache", name),))] = stats["hits"]
+            totals[("cache_misses_total", (("cache", name),))] = stats["misses"]
+        return totals
+
+    def prometheus(self):
+        """All totals in the Prometheus text exposition format."""
+        by_metric = defaultdict(list)
+        for (name, labels), value in sorted(self.totals().items()):
+            base = name.removesuffix("_count").removesuffix("_sum")
+            by_metric[base].append((name, labels, value))
+
+        lines = []
+        for base, samples in by_metric.items():
+            kind, text = HELP.get(base, ("untyped", base))
+            lines.append(f"# HELP {self.prefix}_{base} {text}")
+            lines.append(f"# TYPE {self.prefix}_{base} {kind}")
+            for name, labels, value in samples:
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f"{self.prefix}_{name}{{{label_text}}} {value:.12g}")
+        return "\n".join(lines) + "\n"
+
+    def write_jsonl(self, path):
+        """Append the records collected since the last call to `path`, one JSON object per line."""
+        with self._lock:
+            records, self.records = self.records, []
+        with open(path, "a") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+        return len(records)
+
+    def export(self, directory, name):
+        """Write `<name>.jsonl` (appended) and `<name>.prom` (replaced) into `directory`."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        self.write_jsonl(directory / f"{name}.jsonl")
+        (directory / f"{name}.prom").write_text(self.prometheus())
+
+
+# Process-wide collector used by the examples
+METRICS = Metrics()
+
+
+def export_from_env(name, metrics=METRICS):
+    """Export `metrics` to $METRICS_DIR when that variable is set; a no-op otherwise."""
+    if directory := os.getenv("METRICS_DIR"):
+        metrics.export(directory, name)
+
+
+def is_cache_hit(generation):
+    """
+    Whether a generation came from a LangChain cache: common.llm_cache marks
+    its hits, and LangChain itself zeroes `total_cost` on every cached message.
+    """
+    if (generation.generation_info or {}).get("cached"):
+        return True
+    usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+    return usage.get("total_cost") == 0
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """
+    LangChain callback that times every graph node and chat-model call.
+    LLM calls are attributed to the node they ran in, with token usage,
+    time-to-first-token (when streaming) and estimated cost.
+    Pass it in the run config: `graph.invoke(inputs, {"callbacks": [handler]})`.
+    """
+
+    def __init__(self, metrics=METRICS):
+        self.metrics = metrics
+        self._nodes = {}
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        if node and kwargs.get("name") == node:
+            with self._lock:
+                # A node's own runnable may carry the node's name too; only the outer run is timed
+                if parent_run_id not in self._nodes:
+                    self._nodes[run_id] = (node, time.perf_counter())
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        with self._lock:
+            started = self._nodes.pop(run_id, None)
+        if started:
+            self.metrics.observe("node", started[0], time.perf_counter() - started[1])
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._nodes.pop(run_id, None)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        metadata = metadata or {}
+        call = SimpleNamespace(
+            node=metadata.get("langgraph_node") or "llm",
+            model=metadata.get("ls_model_name"),
+            started=time.perf_counter(),
+            first_token=None,
+        )
+        with self._lock:
+            self._calls[run_id] = call
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        call = self._calls.get(run_id)
+        if call and call.first_token is None:
+            call.first_token = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self._lock:
+            call = self._calls.pop(run_id, None)
+        if call is None:
+            return
+
+        generations = [generation for batch in response.generations for generation in batch]
+        if generations and all(is_cache_hit(generation) for generation in generations):
+            # Nothing reached the API, so the stored usage isn't spent again
+            self.metrics.count("llm_cache_hits_total", node=call.node)
+            return
+
+        prompt_tokens = completion_tokens = 0
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            prompt_tokens += usage.get("input_tokens", 0)
+            completion_tokens += usage.get("output_tokens", 0)
+        model = call.model or (response.llm_output or {}).get("model_name")
+
+        self.metrics.record_llm(
+            call.node, model, time.perf_counter() - call.started,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            time_to_first_token=call.first_token - call.started if call.first_token else None,
+        )
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._calls.pop(run_id, None)
+
+
+class InstrumentedSearchClient(ClientWrapper):
+    """Times every `search` of a wrapped search client; everything else passes through."""
+
+    def __init__(self, client, metrics=METRICS, name="tavily"):
+        self.client = client
+        self.metrics = metrics
+        self.name = name
+
+    def search(self, query, **params):
+        started = time.perf_counter()
+        try:
+            return self.client.search(query=query, **params)
+        finally:
+            self.metrics.observe("search", self.name, time.perf_counter() - started, query=query)
+
+
+class InstrumentedOpenAI(ClientWrapper):
+    """
+    Wraps an OpenAI or AsyncOpenAI client so `chat.completions.create`
+    records latency, token usage and cost under `name`. Streamed calls are
+    timed to their last chunk; pass stream_options={"include_usage": True}
+    to get token counts for them too. A stream the caller stops reading
+    early is closed, which ends generation, and its completion tokens are
+    counted as one per chunk read, since usage only arrives at the end.
+    """
+
+    def __init__(self, client, metrics=METRICS, name="agent"):
+        self.client = client
+        self.metrics = metrics
+        self.name = name
+        create = client.chat.completions.create
+        wrapped = self._acreate if inspect.iscoroutinefunction(create) else self._create
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=wrapped))
+
+    def _record(self, model, started, usage, first_token=None):
+        self.metrics.record_llm(
+            self.name, model, time.perf_counter() - started,
+            prompt_tokens=getattr(usage, "prompt_tokens", 0) if usage else 0,
+            completion_tokens=getattr(usage, "completion_tokens", 0) if usage else 0,
+            time_to_first_token=first_token - started if first_token else None,
+        )
+
+    def _create(self, **params):
+        started = time.perf_counter()
+        response = self.client.chat.completions.create(**params)
+        if params.get("stream"):
+            return self._stream(response, params.get("model"), started)
+        self._record(params.get("model"), started, response.usage)
+        return response
+
+    def _stream(self, chunks, model, started):
+        first_token = usage = None
+        received = 0
+        try:
+            for chunk in chunks:
+                if first_token is None:
+                    first_token = time.perf_counter()
+                usage = getattr(chunk, "usage", None) or usage
+                received += 1
+                yield chunk
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()
+            self._record(model, started, usage or self._partial_usage(received), first_token)
+
+    async def _acreate(self, **params):
+        started = time.perf_counter()
+        response = await self.client.chat.completions.create(**params)
+        if params.get("stream"):
+            return self._astream(response, params.get("model"), started)
+        self._record(params.get("model"), started, response.usage)
+        return response
+
+    async def _astream(self, chunks, model, started):
+        first_token = usage = None
+        received = 0
+        try:
+            async for chunk in chunks:
+                if first_token is None:
+                    first_token = time.perf_counter()
+                usage = getattr(chunk, "usage", None) or usage
+                received += 1
+                yield chunk
+        finally:
+            close = getattr(chunks, "aclose", None) or getattr(chunks, "close", None)
+            if close is not None and inspect.isawaitable(closed := close()):
+                await closed
+            self._record(model, started, usage or self._partial_usage(received), first_token)
+
+    @staticmethod
+    def _partial_usage(chunks):
+        return SimpleNamespace(prompt_tokens=0, completion_tokens=chunks)
@@ -0,0 +1,53 @@
+from functools import lru_cache
+
+from common.tokens import content_terms
+
+EMPTY_LOG = {"searched": [], "saved": 0}
+
+
+@lru_cache(maxsize=4096)
+def shingles(query, k=4):
+    """
+    Character k-grams of each content word, so reordering, stop words and
+    small inflections ("emission" vs "emissions") barely change the set.
+    """
+    grams = set()
+    for term in content_terms(query):
+        padded = f" {term} "
+        grams.update(padded[i:i + k] for i in range(max(1, len(padded) - k + 1)))
+    return frozenset(grams)
+
+
+def similarity(a, b):
+    """Jaccard similarity of two queries' shingle sets (0-1)."""
+    sa, sb = shingles(a), shingles(b)
+    if not sa or not sb:
+        return float(a.strip().lower() == b.strip().lower())
+    return len(sa & sb) / len(sa | sb)
+
+
+def novel_queries(queries, searched, threshold=0.6):
+    """
+    Split `queries` into those worth searching and near-duplicates of a query
+    already searched this run (or earlier in the same batch).
+    Results for a skipped query are already in the run's sources, so they
+    are reused by the writer without another search.
+    """
+    fresh, skipped = [], []
+    for query in queries:
+        if any(similarity(query, seen) >= threshold for seen in (*searched, *fresh)):
+            skipped.append(query)
+        else:
+            fresh.append(query)
+    return fresh, skipped
+
+
+def merge_query_log(existing, new):
+    """State reducer for the per-run query log; None starts a fresh run."""
+    if new is None:
+        return {"searched": [], "saved": 0}
+    existing = existing or EMPTY_LOG
+    return {
+        "searched": existing["searched"] + new.get("searched", []),
+        "saved": existing["saved"] + new.get("saved", 0),
+    }
@@ -0,0 +1,128 @@
+import asyncio
+import threading
+import time
+
+from langchain_core.runnables import RunnableLambda
+
+from common.tokens import estimate_tokens
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter for both requests and LLM tokens, shared by every
+    model call in a process (the sync and async paths draw from the same buckets).
+
+    Each call reserves one request plus its estimated prompt and completion
+    tokens before it is sent. Once the response's usage is known, `settle`
+    refunds an over-estimate (or takes back an under-estimate), so a batch
+    keeps the token bucket close to full instead of paying for worst cases.
+    Buckets start full, so a batch can use the whole burst immediately.
+    """
+
+    def __init__(self, requests_per_minute=500, tokens_per_minute=200_000, burst_seconds=10):
+        self.request_rate = requests_per_minute / 60
+        self.token_rate = tokens_per_minute / 60
+        self.request_capacity = max(1.0, self.request_rate * burst_seconds)
+        self.token_capacity = max(1.0, self.token_rate * burst_seconds)
+        self.requests = self.request_capacity
+        self.tokens = self.token_capacity
+        self.waits = 0
+        self.waited = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._updated = now
+        self.requests = min(self.request_capacity, self.requests + elapsed * self.request_rate)
+        self.tokens = min(self.token_capacity, self.tokens + elapsed * self.token_rate)
+
+    def _try_acquire(self, tokens):
+        """Take a request and `tokens` if both are available; otherwise return the wait in seconds."""
+        tokens = min(tokens, self.token_capacity)
+        with self._lock:
+            self._refill(time.monotonic())
+            if self.requests >= 1 and self.tokens >= tokens:
+                self.requests -= 1
+                self.tokens -= tokens
+                return 0.0
+            return max(
+                (1 - self.requests) / self.request_rate,
+                (tokens - self.tokens) / self.token_rate,
+            )
+
+    def acquire(self, tokens):
+        """Block until one request and `tokens` tokens fit in the buckets."""
+        while (wait := self._try_acquire(tokens)) > 0:
+            self._record_wait(wait)
+            time.sleep(wait)
+
+    async def aacquire(self, tokens):
+        """Async counterpart of `acquire`; waits without holding a worker thread."""
+        while (wait := self._try_acquire(tokens)) > 0:
+            self._record_wait(wait)
+            await asyncio.sleep(wait)
+
+    def settle(self, reserved, used):
+        """Correct a reservation once the real token usage is known."""
+        with self._lock:
+            self._refill(time.monotonic())
+            # May go negative after an under-estimate; later calls then wait it off
+            self.tokens = min(self.token_capacity, self.tokens + reserved - used)
+
+    def _record_wait(self, seconds):
+        with self._lock:
+            self.waits += 1
+            self.waited += seconds
+
+    def stats(self):
+        with self._lock:
+            return {"waits": self.waits, "waited_seconds": self.waited}
+
+
+def _prompt_tokens(value):
+    messages = value.to_messages() if hasattr(value, "to_messages") else value
+    if isinstance(messages, str):
+        return estimate_tokens(messages)
+    return sum(estimate_tokens(str(getattr(m, "content", m))) for m in messages)
+
+
+def _used_tokens(message, fallback):
+    usage = getattr(message, "usage_metadata", None)
+    return usage["total_tokens"] if usage else fallback
+
+
+def rate_limited(model, limiter, expected_output_tokens=512):
+    """
+    Wrap a chat model so each call first reserves capacity from `limiter`.
+    The reservation is the estimated prompt size plus `expected_output_tokens`
+    (or the model's `max_tokens`), and is settled against the reported usage;
+    a call that raises (or is cancelled) gives its whole reservation back.
+    The model is only touched on the first call, so it may be a `LazyModel` proxy.
+    """
+    def reservation(value):
+        return _prompt_tokens(value) + (getattr(model, "max_tokens", None) or expected_output_tokens)
+
+    def invoke(value, config):
+        reserved = reservation(value)
+        limiter.acquire(reserved)
+        used = 0
+        try:
+            response = model.invoke(value, config)
+            used = _used_tokens(response, reserved)
+        finally:
+            limiter.settle(reserved, used)
+        return response
+
+    async def ainvoke(value, config):
+        reserved = reservation(value)
+        await limiter.aacquire(reserved)
+        used = 0
+        try:
+            response = await model.ainvoke(value, config)
+            used = _used_tokens(response, reserved)
+        finally:
+            limiter.settle(reserved, used)
+        return response
+
+    return RunnableLambda(invoke, afunc=ainvoke, name="rate_limited_model")
@@ -0,0 +1,170 @@
+"""
+Per-node model tiers with latency-aware routing and fallback.
+
+Each graph node names the tiers it may use, most preferred first:
+
+    router = ModelRouter(
+        {"fast": Tier(LazyModel(...), max_prompt_tokens=4_000), "standard": Tier(LazyModel(...))},
+        {"review": NodeProfile(["fast", "standard"], latency_budget=5)},
+    )
+    response = router.invoke("review", messages)
+
+For every call the router skips tiers the prompt is too large for, then moves
+any tier whose recent median latency is over the node's `latency_budget` to
+the back of the line, so short critical-path calls don't queue behind a model
+that has slowed down. Latency is tracked per (node, tier), so long `write`
+calls don't make a healthy tier look slow to a short `plan`. Latencies are
+only remembered for `window` seconds, so a demoted tier is tried first again
+once its slow samples have aged out. A call that fails with a retryable error
+moves straight on to the next tier.
+
+Tier models are only touched when a call is routed to them, so LazyModel
+tiers are still built on first use, not when a graph is compiled.
+"""
+import math
+import threading
+import time
+from dataclasses import dataclass, field
+
+from langchain_core.runnables import RunnableLambda
+
+from common.clients import LazyModel
+from common.deadline import LatencyTracker, retryable
+from common.metrics import METRICS
+from common.tokens import estimate_tokens
+
+
+@dataclass
+class Tier:
+    """A model the router can send calls to; prompts over `max_prompt_tokens` skip it."""
+    model: object
+    max_prompt_tokens: int | None = None
+
+
+@dataclass
+class NodeProfile:
+    """The tiers one node may use, most preferred first, and the median latency (seconds) it tolerates."""
+    tiers: list = field(default_factory=list)
+    latency_budget: float | None = None
+
+
+def prompt_tokens(value):
+    """Rough token count of a model input: a string, a list of messages or a prompt value."""
+    if hasattr(value, "to_messages"):
+        value = value.to_messages()
+    if isinstance(value, str):
+        return estimate_tokens(value)
+    return sum(estimate_tokens(m.content if isinstance(m.content, str) else str(m.content)) for m in value)
+
+
+class ModelRouter:
+    """Routes each node's LLM calls to a model tier (see the module docstring)."""
+
+    def __init__(self, tiers, profiles, default=None, window=120.0, min_samples=5, metrics=METRICS):
+        self.tiers = tiers
+        self.profiles = profiles
+        # Nodes without a profile may use any tier, in the order given
+        self.default = default or NodeProfile(list(tiers))
+        self.metrics = metrics
+        self.window = window
+        self.min_samples = min_samples
+        # (node, tier) -> LatencyTracker, created on first use
+        self.latency = {}
+        self._structured = {}
+        self._lock = threading.Lock()
+
+    def profile(self, node):
+        return self.profiles.get(node, self.default)
+
+    def tracker(self, node, name):
+        with self._lock:
+            if (node, name) not in self.latency:
+                self.latency[node, name] = LatencyTracker(
+                    window=100, min_samples=self.min_samples, max_age=self.window
+                )
+            return self.latency[node, name]
+
+    def candidates(self, node, tokens):
+        """Tier names to try for a `tokens`-sized prompt from `node`, in order."""
+        profile = self.profile(node)
+        fits = [
+            name for name in profile.tiers
+            if self.tiers[name].max_prompt_tokens is None or tokens <= self.tiers[name].max_prompt_tokens
+        ]
+        # Nothing fits: the last tier is the node's most capable one
+        fits = fits or profile.tiers[-1:]
+        if profile.latency_budget is None:
+            return fits
+
+        medians = {name: self.tracker(node, name).quantile(0.5) for name in fits}
+        quick = [name for name in fits if medians[name] is None or medians[name] <= profile.latency_budget]
+        slow = sorted((name for name in fits if name not in quick), key=medians.get)
+        return quick + slow
+
+    def model(self, name, schema=None):
+        """The tier's model, or its structured-output variant for `schema` (built on first use)."""
+        if schema is None:
+            return self.tiers[name].model
+        with self._lock:
+            if (name, schema) not in self._structured:
+                model = self.tiers[name].model
+                self._structured[name, schema] = LazyModel(lambda: model.with_structured_output(schema))
+            return self._structured[name, schema]
+
+    def _record(self, node, name, started, error=None):
+        # A failed call counts as infinitely slow, so a failing tier drops behind healthy ones
+        self.tracker(node, name).add(math.inf if error is not None else time.perf_counter() - started)
+        self.metrics.count("model_failures_total" if error is not None else "model_routes_total", node=node, tier=name)
+
+    def invoke(self, node, value, config=None, schema=None):
+        """Call the first tier in `candidates` that answers; `schema` asks for structured output."""
+        names = self.candidates(node, prompt_tokens(value))
+        for i, name in enumerate(names):
+            started = time.perf_counter()
+            try:
+                result = self.model(name, schema).invoke(value, config)
+            except Exception as e:
+                if not retryable(e):
+                    raise
+                self._record(node, name, started, e)
+                if i == len(names) - 1:
+                    raise
+                continue
+            self._record(node, name, started)
+            return result
+
+    async def ainvoke(self, node, value, config=None, schema=None):
+        names = self.candidates(node, prompt_tokens(value))
+        for i, name in enumerate(names):
+            started = time.perf_counter()
+            try:
+                result = await self.model(name, schema).ainvoke(value, config)
+            except Exception as e:
+                if not retryable(e):
+                    raise
+                self._record(node, name, started, e)
+                if i == len(names) - 1:
+                    raise
+                continue
+            self._record(node, name, started)
+            return result
+
+    def runnable(self, node, schema=None):
+        """Runnable that routes its input as a call from `node`, for use in a chain."""
+        def invoke(value, config):
+            return self.invoke(node, value, config, schema)
+
+        async def ainvoke(value, config):
+            return await self.ainvoke(node, value, config, schema)
+
+        return RunnableLambda(invoke, afunc=ainvoke, name=f"route_{node}")
+
+    def stats(self):
+        """Recent median latency and sample count per node and tier."""
+        with self._lock:
+            trackers = dict(self.latency)
+        stats = {}
+        for (node, name), tracker in sorted(trackers.items()):
+            if samples := len(tracker.recent()):
+                stats.setdefault(node, {})[name] = {"p50": tracker.quantile(0.5), "samples": samples}
+        return stats
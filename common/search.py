@@ -0,0 +1,88 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from requests import Session
+from requests.adapters import HTTPAdapter
+
+from common.cache import CACHE_DIR, DiskCache, cache_key
+from common.deadline import clamp_timeout
+from common.wrappers import ClientWrapper
+
+
+class DeadlineSession(Session):
+    """requests Session whose request timeouts are cut to the current run deadline (see common.deadline)."""
+
+    def request(self, method, url, *args, **kwargs):
+        kwargs["timeout"] = clamp_timeout(kwargs.get("timeout"))
+        return super().request(method, url, *args, **kwargs)
+
+
+def pooled_session(pool_size=8):
+    """Build a requests session that keeps up to `pool_size` connections alive."""
+    from common.cassette import active, cassette_adapter
+    session = DeadlineSession()
+    recorder, player = active()
+    if recorder is None and player is None:
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    else:
+        adapter = cassette_adapter(recorder, player, pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class SearchExecutor:
+    """Run several search queries at once against one shared search client."""
+
+    def __init__(self, client, max_workers=4):
+        self.client = client
+        self.max_workers = max_workers
+
+    def search_many(self, queries, **params):
+        """
+        Search every query concurrently and return the responses in query order.
+        A query that fails yields an empty result set with the error attached,
+        so one bad query never sinks the whole research step.
+        """
+        if not queries:
+            return []
+
+        workers = min(self.max_workers, len(queries))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # Each search runs in the caller's context, so it keeps the run's deadline and graph node
+            futures = [pool.submit(contextvars.copy_context().run, self._search_one, q, **params) for q in queries]
+            return [f.result() for f in futures]
+
+    def _search_one(self, query, **params):
+        try:
+            return self.client.search(query=query, **params)
+        except Exception as e:
+            print(f"[Search failed] {query}: {e}")
+            return {"query": query, "results": [], "error": str(e)}
+
+
+class CachedSearchClient(ClientWrapper):
+    """
+    Drop-in wrapper around a search client (e.g. TavilyClient) that caches
+    responses on disk, keyed by the normalized query plus search parameters.
+    The cache is bypassed while a cassette records or replays. Anything it
+    doesn't cache (extract, crawl, ...) goes straight to the wrapped client.
+    """
+
+    def __init__(self, client, path=None, ttl=24 * 60 * 60, max_entries=5_000):
+        self.client = client
+        self.cache = DiskCache(path or CACHE_DIR / "search.sqlite", ttl=ttl, max_entries=max_entries)
+
+    def search(self, query, **params):
+        from common.cassette import in_use
+        if in_use():
+            return self.client.search(query=query, **params)
+        key = cache_key(" ".join(query.lower().split()), params)
+        response = self.cache.get(key)
+        if response is None:
+            response = self.client.search(query=query, **params)
+            self.cache.set(key, response)
+        return response
+
+    def stats(self):
+        return self.cache.stats()
@@ -0,0 +1,122 @@
+import hashlib
+import math
+import threading
+from collections import Counter, OrderedDict
+
+from common.tokens import estimate_tokens, tokenize
+
+
+def normalized(text):
+    """`text` lowercased with runs of whitespace collapsed, so trivial variants compare equal."""
+    return " ".join(text.lower().split())
+
+
+def content_hash(text):
+    """Hash of the whitespace- and case-normalized text, used to spot duplicates."""
+    return hashlib.sha1(normalized(text).encode("utf-8")).hexdigest()
+
+
+def add_sources(existing, new):
+    """State reducer: append only sources whose content has not been seen yet; None starts afresh."""
+    if new is None:
+        return []
+    merged = list(existing or [])
+    seen = {content_hash(s) for s in merged}
+    for source in new or []:
+        key = content_hash(source)
+        if key not in seen:
+            seen.add(key)
+            merged.append(source)
+    return merged
+
+
+class SourceStore:
+    """
+    Lexical (BM25) index over research passages.
+    Passages are tokenized once and cached by content hash, so re-ranking the
+    same growing source list on every revision only pays for the new entries.
+    The cache is an LRU of `cache_size` passages, so a long-lived store shared
+    by many essays doesn't keep every passage it has ever seen.
+    """
+
+    def __init__(self, passage_words=120, k1=1.5, b=0.75, cache_size=4096):
+        self.passage_words = passage_words
+        self.k1 = k1
+        self.b = b
+        self.cache_size = cache_size
+        self._passages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _split(self, source):
+        words = source.split()
+        size = self.passage_words
+        return [" ".join(words[i:i + size]) for i in range(0, len(words), size)]
+
+    def _cached(self, key):
+        with self._lock:
+            entry = self._passages.get(key)
+            if entry is not None:
+                self._passages.move_to_end(key)
+            return entry
+
+    def _cache(self, key, entry):
+        with self._lock:
+            self._passages[key] = entry
+            self._passages.move_to_end(key)
+            while len(self._passages) > self.cache_size:
+                self._passages.popitem(last=False)
+
+    def _index(self, sources):
+        """
+        (passage, terms, length) per passage key, in source order. The caller
+        ranks from this dict, so LRU eviction can't drop a passage mid-ranking.
+        """
+        passages = {}
+        for source in sources:
+            for passage in self._split(source):
+                key = content_hash(passage)
+                if key in passages:
+                    continue
+                entry = self._cached(key)
+                if entry is None:
+                    terms = Counter(tokenize(passage))
+                    entry = (passage, terms, sum(terms.values()))
+                    self._cache(key, entry)
+                passages[key] = entry
+        return passages
+
+    def top_passages(self, sources, query, k=8, token_budget=1500):
+        """Return the best-matching passages for `query`, at most `k` and within `token_budget`."""
+        passages = self._index(sources)
+        if not passages:
+            return []
+
+        n = len(passages)
+        avg_len = sum(length for _, _, length in passages.values()) / n
+        query_terms = set(tokenize(query))
+        doc_freq = Counter()
+        for _, terms, _ in passages.values():
+            doc_freq.update(query_terms & terms.keys())
+
+        def score(key):
+            _, terms, length = passages[key]
+            total = 0.0
+            for term in query_terms:
+                tf = terms.get(term, 0)
+                if not tf:
+                    continue
+                idf = math.log(1 + (n - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+                norm = tf + self.k1 * (1 - self.b + self.b * length / avg_len)
+                total += idf * tf * (self.k1 + 1) / norm
+            return total
+
+        selected = []
+        used = 0
+        for key in sorted(passages, key=score, reverse=True)[:k]:
+            passage = passages[key][0]
+            cost = estimate_tokens(passage)
+            if used + cost > token_budget:
+                continue
+            selected.append(passage)
+            used += cost
+        return selected
@@ -0,0 +1,72 @@
+import time
+
+from langgraph.config import get_stream_writer
+
+
+class StreamSink:
+    """
+    Collects streamed text chunks inside a graph node and forwards them to
+    the graph's custom stream in small batches, so callers of
+    `graph.stream(..., stream_mode="custom")` can relay tokens while the node
+    itself does no I/O. Also measures time-to-first-token.
+
+    Events written to the stream:
+    - {"type": "token", "text": ...} for each batch of chunks
+    - {"type": "done", "time_to_first_token": ..., "total_time": ...} at the end
+    """
+
+    def __init__(self, writer=None, flush_chars=32, flush_interval=0.05):
+        self.writer = writer or get_stream_writer()
+        self.flush_chars = flush_chars
+        self.flush_interval = flush_interval
+        self.chunks = []
+        self.started = time.perf_counter()
+        self.first_token_at = None
+        self._pending = []
+        self._pending_chars = 0
+        self._last_flush = self.started
+
+    @property
+    def text(self):
+        return "".join(self.chunks)
+
+    @property
+    def time_to_first_token(self):
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started
+
+    def write(self, text):
+        if not text:
+            return
+        now = time.perf_counter()
+        if self.first_token_at is None:
+            self.first_token_at = now
+        self.chunks.append(text)
+        self._pending.append(text)
+        self._pending_chars += len(text)
+
+        # Always flush the very first token so time-to-first-token stays low downstream
+        if (
+            len(self.chunks) == 1
+            or self._pending_chars >= self.flush_chars
+            or now - self._last_flush >= self.flush_interval
+        ):
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            self.writer({"type": "token", "text": "".join(self._pending)})
+            self._pending = []
+            self._pending_chars = 0
+        self._last_flush = time.perf_counter()
+
+    def close(self):
+        """Flush what's left and emit the timing summary. Returns the full text."""
+        self.flush()
+        self.writer({
+            "type": "done",
+            "time_to_first_token": self.time_to_first_token,
+            "total_time": time.perf_counter() - self.started,
+        })
+        return self.text
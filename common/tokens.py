@@ -0,0 +1,25 @@
+import re
+
+WORD_PATTERN = re.compile(r"\w+")
+
+# Function words carry no topical signal and would make every text "match"
+STOPWORDS = set("""
+a an and are as at be but by for from has have in is it its of on or that the this
+to was were will with which who what how why when where about into than then there
+their they them these those our your we you not can may also more most such
+""".split())
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token) that needs no tokenizer download."""
+    return max(1, len(text) // 4) if text else 0
+
+
+def tokenize(text):
+    """Lowercase word tokens used for lexical matching."""
+    return WORD_PATTERN.findall(text.lower())
+
+
+def content_terms(text):
+    """Word tokens with stop words removed, for similarity scoring."""
+    return [t for t in tokenize(text) if t not in STOPWORDS]
@@ -0,0 +1,18 @@
+class ClientWrapper:
+    """
+    Base for wrappers that keep the wrapped client in `self.client`: any
+    attribute the wrapper doesn't define is looked up on the client.
+    """
+
+    def __getattr__(self, name):
+        # Protocol probes (__deepcopy__, __setstate__, ...) must find the wrapper's own behaviour,
+        # not the client's
+        if name.startswith("__"):
+            raise AttributeError(name)
+        # Read `client` from __dict__: while copying or unpickling it isn't set yet, and
+        # `self.client` would come back here and recurse
+        try:
+            client = self.__dict__["client"]
+        except KeyError:
+            raise AttributeError(name) from None
+        return getattr(client, name)
@@ -1,5 +1,40 @@
-def main():
-    print("Hello from langgraph-mastery!")
+"""
+Run one of the examples:
+
+    python main.py reflexion
+    python main.py --list
+    python main.py reflexion --record runs/before.cassette
+    python main.py reflexion --replay runs/before.cassette --zero-latency
+
+Only the chosen example is imported, and its API clients are built on first use.
+"""
+import argparse
+from pathlib import Path
+
+from common.examples import EXAMPLES, load_example
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("example", nargs="?", choices=list(EXAMPLES), help="example to run")
+    parser.add_argument("--list", action="store_true", help="list the examples and exit")
+    parser.add_argument(
+        "--record", type=Path, metavar="CASSETTE",
+        help="record every LLM and search call to a cassette (the response and search caches are bypassed)",
+    )
+    parser.add_argument("--replay", type=Path, metavar="CASSETTE", help="serve LLM and search calls from a cassette")
+    parser.add_argument("--zero-latency", action="store_true", help="replay without the recorded delays")
+    args = parser.parse_args(argv)
+
+    if args.list or args.example is None:
+        for name, directory in EXAMPLES.items():
+            print(f"{name:<12}{directory}")
+        return
+
+    if args.record or args.replay:
+        from common.cassette import configure
+        configure(record=args.record, replay=args.replay, zero_latency=args.zero_latency)
+    load_example(args.example).main()
 
 
 if __name__ == "__main__":
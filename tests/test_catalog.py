@@ -0,0 +1,33 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from common.examples import load_example
+
+load_example("react")  # puts the example directory, and so catalog.py, on sys.path
+from catalog import DictCatalog, SQLiteCatalog, build_catalog
+
+# Far more than fuzzy_candidates cities share "sa", and the intended one sorts after all of them
+CITIES = {f"Sab {i:03}": "Mild" for i in range(500)}
+CITIES["Santa Teresa"] = "Sunny"
+
+
+class FuzzyResolveTest(unittest.TestCase):
+    def check(self, catalog):
+        bucket = catalog.keys_with_prefix("sa", 1000)
+        self.assertGreater(bucket.index("santa teresa"), catalog.fuzzy_candidates)
+        self.assertEqual(catalog.resolve("Santa Terese"), "santa teresa")
+        self.assertEqual(catalog.lookup("santa  TERESE")["weather"], "Sunny")
+
+    def test_dict_catalog(self):
+        self.check(DictCatalog(CITIES, {}, {}))
+
+    def test_sqlite_catalog(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "catalog.sqlite"
+            build_catalog(path, CITIES, {}, {})
+            self.check(SQLiteCatalog(path))
+
+
+if __name__ == "__main__":
+    unittest.main()
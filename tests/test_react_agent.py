@@ -0,0 +1,45 @@
+import unittest
+
+from common.examples import load_example
+
+react = load_example("react")
+
+
+class ParseActionsTest(unittest.TestCase):
+    def test_actions_after_made_up_observation_are_ignored(self):
+        reply = (
+            "Thought: I need the weather first.\n"
+            "Action: check_weather: Tokyo\n"
+            "Observation: Tokyo: Sunny, 25°C\n"
+            "Thought: Now hotels.\n"
+            "Action: search_hotels: Tokyo, luxury\n"
+        )
+        self.assertEqual(react.parse_actions(reply), [("check_weather", "Tokyo")])
+
+    def test_actions_after_stop_are_ignored(self):
+        reply = (
+            "Action: check_weather: Tokyo\n"
+            "Action: search_hotels: Tokyo, mid\n"
+            "STOP\n"
+            "Action: get_attractions: Tokyo\n"
+        )
+        self.assertEqual(
+            react.parse_actions(reply), [("check_weather", "Tokyo"), ("search_hotels", "Tokyo, mid")]
+        )
+
+    def test_block_without_terminator(self):
+        self.assertEqual(react.parse_actions("Thought: x\nAction: check_weather: Paris"), [("check_weather", "Paris")])
+
+    def test_final_answer_has_no_actions(self):
+        self.assertEqual(react.parse_actions("Answer: Pack light. STOP at the café.\n"), [])
+
+
+class ResponseCacheKeyTest(unittest.TestCase):
+    def test_modes_do_not_share_cache_entries(self):
+        agents = [react.make_agent(mode) for mode in ("text", "stop", "stream")]
+        keys = {repr(agent.cache_params(agent.params(0))) for agent in agents}
+        self.assertEqual(len(keys), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()